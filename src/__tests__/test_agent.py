@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import agent
+import config
+from benchmarks import mock_server
+from utils import llm_backends
+
+
+class Preempted(BaseException):
+    """The machine went away mid-step; not an Exception, so nothing in the agent catches it."""
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    synthesizer = mock_server.ObjectSynthesizer(seed=0)
+    calls = {'count': 0, 'preempt_at': None}
+
+    class FakeBackend(llm_backends.LLMBackend):
+        provider = 'openai'
+
+        def generate(self, model, prompt, system, schema, max_tokens, temperature, messages=None):
+            calls['count'] += 1
+            if calls['count'] == calls['preempt_at']:
+                raise Preempted
+            text = json.dumps(synthesizer.synthesize(schema) if schema else {'think': 'ok'})
+            return text, {'promptTokens': 100, 'completionTokens': 10, 'totalTokens': 110}
+
+    monkeypatch.setitem(llm_backends.BACKENDS, 'openai', lambda settings: FakeBackend())
+    monkeypatch.setattr(llm_backends, '_backends', {})
+    monkeypatch.setattr(config, '_configs', {})
+    monkeypatch.setenv('LLM_PROVIDER', 'openai')
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.delenv('JINA_API_KEY', raising=False)
+    monkeypatch.setattr(agent, 'SEARCH_PROVIDER', 'jina')
+    monkeypatch.setattr(agent, 'STEP_SLEEP', 0)
+    monkeypatch.setattr(agent, 'search', lambda query, tracker: {'response': {'data': mock_server.search_results(query)}})
+    monkeypatch.setattr(agent, 'read_url', lambda url, tracker: {'response': {'data': mock_server.page(url)}})
+    return calls
+
+
+def test_resumes_from_checkpoint_after_preemption(fake_llm, tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    fake_llm['preempt_at'] = 6
+    with pytest.raises(Preempted):
+        agent.get_response('What is the capital of France?', token_budget=20000, existing_context={'checkpoint': path})
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines()
+    assert lines
+    saved = json.loads(lines[-1])
+    # a crash mid-write leaves a torn line, the resume drops it
+    with open(path, 'a') as f:
+        f.write('{"torn')
+
+    fake_llm['preempt_at'] = None
+    result = agent.get_response('What is the capital of France?', token_budget=20000, existing_context={'checkpoint': path})
+    assert result['context']['actionTracker'].get_state()['totalStep'] > saved['totalStep']
+    # what was spent before the crash counts against the budget once
+    usage = result['context']['tokenTracker'].get_usage_breakdown()
+    assert usage['checkpoint'] == saved['state']['tokenUsage']['totalTokens']
+    with open(path) as f:
+        assert all(json.loads(line) for line in f)
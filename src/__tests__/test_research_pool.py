@@ -0,0 +1,28 @@
+import pytest
+
+from research_pool import QueueFullError, ResearchPool
+
+
+def test_a_job_whose_session_cannot_be_built_fails_alone(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    # the embedding store directory cannot be created under a file
+    bad_context = {'embeddingStore': str(blocker / 'store')}
+    with ResearchPool(workers=1) as pool:
+        futures = [pool.submit('question', existing_context=dict(bad_context)) for _ in range(2)]
+        for future in futures:
+            with pytest.raises(OSError):
+                future.result(timeout=10)
+        assert pool.stats()['failed'] == 2
+        assert pool.stats()['running'] == 0
+
+
+def test_refuses_jobs_past_the_tenant_share():
+    pool = ResearchPool(workers=0, max_queued=4, max_queued_per_tenant=2)
+    pool.submit('q1', tenant='a')
+    pool.submit('q2', tenant='a')
+    with pytest.raises(QueueFullError):
+        pool.submit('q3', tenant='a')
+    pool.submit('q4', tenant='b')
+    assert pool.stats()['queueDepthByTenant'] == {'a': 2, 'b': 1}
+    pool.shutdown(cancel_queued=True)
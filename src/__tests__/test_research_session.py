@@ -0,0 +1,42 @@
+import threading
+
+from action_types import TokenTracker
+from research_session import ResearchSession
+
+
+def test_close_stops_the_tracker_threads_and_delivers_pending_events():
+    before = threading.active_count()
+    seen = []
+    for _ in range(20):
+        session = ResearchSession()
+        session.token_tracker.on('usage', seen.append)
+        session.action_tracker.on('action', seen.append)
+        session.token_tracker.track_usage('agent', {'promptTokens': 1, 'completionTokens': 1, 'totalTokens': 2})
+        session.close()
+    for thread in threading.enumerate():
+        if thread.name.startswith('event-bus'):
+            thread.join(1)
+    assert threading.active_count() == before
+    assert len(seen) == 20
+    # results keep their trackers, closed ones still count
+    assert session.token_tracker.get_total_usage()['totalTokens'] == 2
+
+
+def test_close_leaves_what_the_caller_passed_in():
+    tracker = TokenTracker()
+    seen = []
+    tracker.on('usage', seen.append)
+    ResearchSession(existing_context={'tokenTracker': tracker}).close()
+    tracker.track_usage('agent', {'promptTokens': 1, 'completionTokens': 1, 'totalTokens': 2})
+    tracker._bus.flush(5)
+    assert len(seen) == 1
+
+
+def test_close_closes_the_stores_it_opened(tmp_path):
+    session = ResearchSession(existing_context={'knowledgeStore': str(tmp_path / 'knowledge'), 'embeddingStore': str(tmp_path / 'embeddings')})
+    store = session.knowledge_store
+    session.passage_index.add_document('https://example.com', 'Paris is the capital of France. ' * 20)
+    assert len(session.embedder.store)
+    session.close()
+    assert store._connections == []
+    assert session.embedder.store._records is None
@@ -1,8 +1,17 @@
 
+import json
+import logging
+import os
+import threading
+from array import array
 from typing import List, Dict, Optional, TypedDict, Union, Any
 
-# Assuming i18nJSON is defined elsewhere. Replace this with your actual implementation.
-i18nJSON = {}  # Placeholder for i18nJSON
+from utils.event_bus import EventBus
+
+logger = logging.getLogger(__name__)
+
+with open(os.path.join(os.path.dirname(__file__), 'utils', 'i18n.json'), encoding='utf-8') as f:
+    i18nJSON = json.load(f)
 
 class LanguageModelUsage(TypedDict):
     promptTokens: int
@@ -10,26 +19,28 @@ class LanguageModelUsage(TypedDict):
     totalTokens: int
 
 class ActionTracker:
-    def __init__(self):
+    def __init__(self, bus: Optional[EventBus] = None):
         self._state: Dict[str, Any] = {
             'thisStep': {'action': 'answer', 'answer': '', 'references': [], 'think': ''},
             'gaps': [],
             'badAttempts': 0,
             'totalStep': 0
         }
-        self._listeners: List[callable] = []
+        self._bus: EventBus = bus or EventBus()
+        # a bus handed in may serve other trackers, only one made here is closed with it
+        self._own_bus = bus is None
 
     def track_action(self, new_state: Dict) -> None:
         self._state.update(new_state)
-        for listener in self._listeners:
-            listener(self._state['thisStep'])
+        # listeners run on the bus threads, hand them a snapshot rather than the live step
+        self._bus.publish('action', dict(self._state['thisStep']))
 
     def track_think(self, think: str, lang: Optional[str] = None, params: Dict = {}) -> None:
         if lang:
             think = getI18nText(think, lang, params)
-        self._state['thisStep']['think'] = think
-        for listener in self._listeners:
-            listener(self._state['thisStep'])
+        self._state['thisStep'] = {**self._state['thisStep'], 'think': think}
+        # consecutive think updates coalesce, a slow client only sees the latest one
+        self._bus.publish('action', dict(self._state['thisStep']), coalesce_key='think')
 
     def get_state(self) -> Dict[str, Any]:
         return self._state.copy()
@@ -42,65 +53,119 @@ class ActionTracker:
             'totalStep': 0
         }
 
-    def on(self, event_name: str, listener: callable) -> None:
+    def on(self, event_name: str, listener: callable, queue_size: Optional[int] = None) -> None:
         if event_name == 'action':
-            self._listeners.append(listener)
+            self._bus.subscribe(event_name, listener, queue_size)
         else:
             raise ValueError(f"Unsupported event: {event_name}")
 
+    def get_bus_metrics(self) -> Dict[str, Any]:
+        return self._bus.get_metrics()
+
+    def close(self) -> None:
+        """Stops the bus threads; events already published still reach their listeners."""
+        if self._own_bus:
+            self._bus.close()
+
 
 class TokenTracker:
-    def __init__(self, budget: Optional[int] = None):
-        self._usages: List[Dict[str, Any]] = []
+    def __init__(self, budget: Optional[int] = None, bus: Optional[EventBus] = None):
         self._budget: Optional[int] = budget
-        self._usage_listeners: List[callable] = []
+        self._bus: EventBus = bus or EventBus()
+        self._own_bus = bus is None
+        self._lock = threading.Lock()
+        self.reset()
 
     def track_usage(self, tool: str, usage: 'LanguageModelUsage') -> None:
-        u: Dict[str, Any] = {'tool': tool, 'usage': usage}
-        self._usages.append(u)
-        for listener in self._usage_listeners:
-            listener(usage)
+        prompt_tokens = usage['promptTokens']
+        completion_tokens = usage['completionTokens']
+        total_tokens = usage['totalTokens']
+
+        # tools such as the evaluator track from several threads at once
+        with self._lock:
+            self._prompt_tokens += prompt_tokens
+            self._completion_tokens += completion_tokens
+            self._total_tokens += total_tokens
+
+            counters = self._tool_counters.get(tool)
+            if counters is None:
+                counters = self._tool_counters[tool] = {'promptTokens': 0, 'completionTokens': 0, 'totalTokens': 0, 'calls': 0}
+                self._tool_ids[tool] = len(self._tools)
+                self._tools.append(tool)
+            counters['promptTokens'] += prompt_tokens
+            counters['completionTokens'] += completion_tokens
+            counters['totalTokens'] += total_tokens
+            counters['calls'] += 1
+
+            self._history_tool.append(self._tool_ids[tool])
+            self._history_prompt.append(prompt_tokens)
+            self._history_completion.append(completion_tokens)
+            self._history_total.append(total_tokens)
+
+        self._bus.publish('usage', usage)
 
     def get_total_usage(self) -> 'LanguageModelUsage':
-        initial_usage: 'LanguageModelUsage' = {'promptTokens': 0, 'completionTokens': 0, 'totalTokens': 0}
         return {
-            'promptTokens': sum(u['usage']['promptTokens'] for u in self._usages),
-            'completionTokens': sum(u['usage']['completionTokens'] for u in self._usages),
-            'totalTokens': sum(u['usage']['totalTokens'] for u in self._usages),
+            'promptTokens': self._prompt_tokens,
+            'completionTokens': self._completion_tokens,
+            'totalTokens': self._total_tokens,
         }
 
     def get_total_usage_snake_case(self) -> Dict[str, int]:
         return {
-            'prompt_tokens': sum(u['usage']['promptTokens'] for u in self._usages),
-            'completion_tokens': sum(u['usage']['completionTokens'] for u in self._usages),
-            'total_tokens': sum(u['usage']['totalTokens'] for u in self._usages),
+            'prompt_tokens': self._prompt_tokens,
+            'completion_tokens': self._completion_tokens,
+            'total_tokens': self._total_tokens,
         }
 
     def get_usage_breakdown(self) -> Dict[str, int]:
-        breakdown: Dict[str, int] = {}
-        for u in self._usages:
-            tool = u['tool']
-            usage = u['usage']['totalTokens']
-            breakdown[tool] = breakdown.get(tool, 0) + usage
-        return breakdown
+        return {tool: counters['totalTokens'] for tool, counters in self._tool_counters.items()}
+
+    def get_usage_snapshot(self) -> Dict[str, Dict[str, int]]:
+        # per-tool counters copied as-is, cheap enough to serve from a metrics endpoint
+        return {tool: dict(counters) for tool, counters in self._tool_counters.items()}
+
+    def get_usages(self) -> List['TokenUsage']:
+        # rebuilt from the compact history, meant for audit rather than the hot path
+        return [
+            {'tool': self._tools[tool_id], 'usage': {'promptTokens': p, 'completionTokens': c, 'totalTokens': t}}
+            for tool_id, p, c, t in zip(self._history_tool, self._history_prompt, self._history_completion, self._history_total)
+        ]
 
     def print_summary(self) -> None:
         breakdown = self.get_usage_breakdown()
-        print('Token Usage Summary:', {
+        logger.info('Token Usage Summary: %s', {
             'budget': self._budget,
             'total': self.get_total_usage(),
             'breakdown': breakdown
         })
 
     def reset(self) -> None:
-        self._usages = []
-
-    def on(self, event_name: str, listener: callable) -> None:
+        self._prompt_tokens = 0
+        self._completion_tokens = 0
+        self._total_tokens = 0
+        self._tool_counters: Dict[str, Dict[str, int]] = {}
+        self._tools: List[str] = []
+        self._tool_ids: Dict[str, int] = {}
+        # audit history, one entry per tracked call in parallel typed arrays
+        self._history_tool = array('I')
+        self._history_prompt = array('q')
+        self._history_completion = array('q')
+        self._history_total = array('q')
+
+    def on(self, event_name: str, listener: callable, queue_size: Optional[int] = None) -> None:
         if event_name == 'usage':
-            self._usage_listeners.append(listener)
+            self._bus.subscribe(event_name, listener, queue_size)
         else:
             raise ValueError(f"Unsupported event: {event_name}")
 
+    def get_bus_metrics(self) -> Dict[str, Any]:
+        return self._bus.get_metrics()
+
+    def close(self) -> None:
+        if self._own_bus:
+            self._bus.close()
+
 
 class StepAction(TypedDict):
     action: str
@@ -287,17 +352,17 @@ class ChatCompletionChunk(TypedDict):
 def getI18nText(key: str, lang: str = 'en', params: Dict[str, str] = {}) -> str:
     i18n_data: Dict[str, Any] = i18nJSON  # Assuming i18nJSON is defined
     if lang not in i18n_data:
-        print(f"Language '{lang}' not found, falling back to English.")
+        logger.warning("Language '%s' not found, falling back to English.", lang)
         lang = 'en'
 
     text: Optional[str] = i18n_data.get(lang, {}).get(key)
 
     if text is None:
-        print(f"Key '{key}' not found for language '{lang}', falling back to English.")
+        logger.warning("Key '%s' not found for language '%s', falling back to English.", key, lang)
         text = i18n_data.get('en', {}).get(key)
 
         if text is None:
-            print(f"Key '{key}' not found for English either.")
+            logger.warning("Key '%s' not found for English either.", key)
             return key
 
     if params:
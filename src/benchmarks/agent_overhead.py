@@ -0,0 +1,244 @@
+"""CPU cost of get_response itself, with every provider answering instantly.
+
+Runs a corpus of questions through get_response against an in-process fake LLM backend
+and fake search/read tools (the mock server's generators, minus HTTP), so what is measured
+is the agent's own overhead. Reports CPU time per phase, peak RSS and steps/sec, and
+writes them as JSON to compare across commits:
+
+    python src/benchmarks/agent_overhead.py --questions src/evals/ego-questions.json --output bench.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from benchmarks import import_time, mock_server  # noqa: E402
+
+DEFAULT_QUESTIONS = os.path.join(SRC_DIR, 'evals', 'ego-questions.json')
+DEFAULT_ACTIONS = ('search', 'visit', 'reflect', 'answer')
+DEFAULT_TOKEN_BUDGET = 200_000
+
+# phase -> agent-module functions, or (class, method), whose own CPU time counts toward it
+PHASES: Dict[str, List] = {
+    'prompt': ['get_prompt'],
+    'schema': [('Schemas', 'get_agent_schema'), ('Schemas', 'get_evaluator_schema'), ('Schemas', 'get_query_rewriter_schema'),
+               ('Schemas', 'get_question_profile_schema'), ('Schemas', 'get_code_generator_schema')],
+    'urls': ['addToAllURLs', 'countUrlParts', 'filterURLs', 'rankURLs', 'keepKPerHostname', 'weightedURLToString',
+             'sampleMultinomial', 'update_references', 'normalizeUrl'],
+    'knowledge': ['build_msgs_from_knowledge', 'compose_msgs', 'compact_knowledge', 'select_knowledge', 'filter_snippets'],
+    'passages': [('PassageIndex', 'add_document'), ('PassageIndex', 'search')],
+}
+
+
+class PhaseTimer:
+    """Exclusive thread CPU time per phase: a phase called inside another is only counted once."""
+
+    def __init__(self):
+        self.cpu: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def wrap(self, phase: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            stack = self._local.__dict__.setdefault('stack', [])
+            now = time.thread_time()
+            if stack:
+                stack[-1][1] += now - stack[-1][2]
+            entry = [phase, 0.0, now]
+            stack.append(entry)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = time.thread_time()
+                stack.pop()
+                entry[1] += end - entry[2]
+                with self._lock:
+                    self.cpu[phase] += entry[1]
+                    self.calls[phase] += 1
+                if stack:
+                    stack[-1][2] = end
+
+        return timed
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.cpu)
+
+
+def instrument(agent, timer: PhaseTimer) -> None:
+    for phase, targets in PHASES.items():
+        for target in targets:
+            if isinstance(target, tuple):
+                cls = getattr(agent, target[0])
+                setattr(cls, target[1], timer.wrap(phase, getattr(cls, target[1])))
+            else:
+                setattr(agent, target, timer.wrap(phase, getattr(agent, target)))
+
+
+def install_fakes(agent, timer: PhaseTimer, actions, pass_rate: float, seed: int) -> None:
+    from utils import llm_backends
+
+    synthesizer = mock_server.ObjectSynthesizer(actions, pass_rate, seed)
+
+    class FakeBackend(llm_backends.LLMBackend):
+        provider = 'openai'
+
+        def generate(self, model, prompt, system, schema, max_tokens, temperature, messages=None):
+            text = json.dumps(synthesizer.synthesize(schema) if schema else {'think': 'ok'})
+            turns = llm_backends.chat_messages(prompt, messages)
+            prompt_tokens = (len(system or '') + sum(len(t['content']) for t in turns)) // 4
+            return text, {'promptTokens': prompt_tokens, 'completionTokens': len(text) // 4, 'totalTokens': prompt_tokens + len(text) // 4}
+
+    FakeBackend.generate = timer.wrap('fake_llm', FakeBackend.generate)
+    llm_backends.register_backend('openai', lambda config: FakeBackend())
+    os.environ.update({'LLM_PROVIDER': 'openai', 'OPENAI_API_KEY': 'bench'})
+    os.environ.pop('JINA_API_KEY', None)
+
+    agent.SEARCH_PROVIDER = 'jina'
+    agent.STEP_SLEEP = 0
+    agent.search = timer.wrap('fake_web', lambda query, tracker: {'response': {'data': mock_server.search_results(query)}})
+    agent.read_url = timer.wrap('fake_web', lambda url, tracker: {'response': {'data': mock_server.page(url)}})
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(questions: List[str], token_budget: int, actions, pass_rate: float, seed: int, log_level: str = 'INFO') -> Dict:
+    import agent
+    from utils.log_tools import configure_logging
+
+    timer = PhaseTimer()
+    instrument(agent, timer)
+    install_fakes(agent, timer, actions, pass_rate, seed)
+    steps = {'count': 0}
+    get_agent_schema = agent.Schemas.get_agent_schema
+
+    def counted(*args, **kwargs):
+        steps['count'] += 1
+        return get_agent_schema(*args, **kwargs)
+
+    agent.Schemas.get_agent_schema = counted
+
+    per_question = []
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    with open(os.devnull, 'w') as devnull:
+        # formatting and writing log records is part of the agent's cost, they are only kept off the terminal
+        configure_logging(log_level, devnull)
+        for question in questions:
+            before_steps, before_phases = steps['count'], timer.snapshot()
+            q_wall, q_cpu = time.perf_counter(), time.process_time()
+            result = agent.get_response(question, token_budget=token_budget)
+            q_wall, q_cpu = time.perf_counter() - q_wall, time.process_time() - q_cpu
+            after_phases = timer.snapshot()
+            per_question.append({
+                'question': question,
+                'steps': steps['count'] - before_steps,
+                'wall_s': round(q_wall, 4),
+                'cpu_s': round(q_cpu, 4),
+                'phases_cpu_s': {p: round(after_phases.get(p, 0.0) - before_phases.get(p, 0.0), 4) for p in after_phases},
+                'tokens': result['context']['tokenTracker'].get_total_usage()['totalTokens'],
+                'is_final': bool(result['isFinal']),
+                'peak_rss_mb': round(peak_rss_mb(), 1),
+            })
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+
+    phases = timer.snapshot()
+    harness = phases.get('fake_llm', 0.0) + phases.get('fake_web', 0.0)
+    agent_cpu = cpu - harness
+    return {
+        'totals': {
+            'questions': len(questions),
+            'steps': steps['count'],
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu, 4),
+            'agent_cpu_s': round(agent_cpu, 4),
+            'steps_per_sec': round(steps['count'] / wall, 2) if wall else None,
+            'agent_cpu_ms_per_step': round(agent_cpu * 1000 / steps['count'], 3) if steps['count'] else None,
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        },
+        'phases': {
+            phase: {
+                'cpu_s': round(seconds, 4),
+                'calls': timer.calls[phase],
+                'share_of_agent_cpu': round(seconds / agent_cpu, 4) if agent_cpu > 0 and not phase.startswith('fake_') else None,
+            }
+            for phase, seconds in sorted(phases.items(), key=lambda x: -x[1])
+        },
+        'per_question': per_question,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', default=DEFAULT_QUESTIONS, help='JSON list of {"question": ...} or of strings')
+    parser.add_argument('--limit', type=int, help='only the first N questions')
+    parser.add_argument('--repeat', type=int, default=1, help='run the corpus this many times')
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET)
+    parser.add_argument('--actions', default=','.join(DEFAULT_ACTIONS), help='agent actions the fake LLM cycles through')
+    parser.add_argument('--pass-rate', type=float, default=0.5, help='share of evaluations that pass; lower means more steps per question')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log-level', default='INFO', help='agent log level during the run; DEBUG adds the per-step dumps')
+    parser.add_argument('--skip-import-time', action='store_true')
+    parser.add_argument('--output', help='JSON results file, default benchmark-<commit>.json')
+    args = parser.parse_args(argv)
+
+    with open(args.questions) as f:
+        corpus = [q['question'] if isinstance(q, dict) else q for q in json.load(f)]
+    questions = corpus[:args.limit] * args.repeat
+
+    commit = git_commit()
+    import_ms = None if args.skip_import_time else import_time.measure('agent', 3)['cumulative_ms']
+    results = run(questions, args.token_budget, args.actions.split(','), args.pass_rate, args.seed, args.log_level)
+    report = {
+        'benchmark': 'agent_overhead',
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {'questions': args.questions, 'limit': args.limit, 'repeat': args.repeat, 'token_budget': args.token_budget,
+                     'actions': args.actions, 'pass_rate': args.pass_rate, 'seed': args.seed, 'log_level': args.log_level},
+        'import_ms': import_ms,
+        **results,
+    }
+
+    output = args.output or f'benchmark-{commit}.json'
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    totals = report['totals']
+    print(f"{totals['questions']} questions, {totals['steps']} steps in {totals['wall_s']:.2f}s: "
+          f"{totals['steps_per_sec']} steps/s, {totals['agent_cpu_ms_per_step']} ms agent CPU/step, peak RSS {totals['peak_rss_mb']} MB")
+    if import_ms is not None:
+        print(f'cold import of agent: {import_ms:.1f} ms')
+    for phase, stats in report['phases'].items():
+        share = f"{stats['share_of_agent_cpu']:.1%}" if stats['share_of_agent_cpu'] is not None else 'harness'
+        print(f"  {phase:<10} {stats['cpu_s'] * 1000:9.1f} ms  {stats['calls']:7d} calls  {share}")
+    print(f'results written to {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Cold-import regression benchmark for the agent entry point.
+
+Imports the module in fresh interpreters under `python -X importtime` and fails when the
+fastest run goes over the budget, or when a module that must load lazily (provider SDKs,
+pydantic, HTTP clients) is pulled in at import time.
+
+    python src/benchmarks/import_time.py --threshold-ms 300 --runs 5
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULE = 'agent'
+DEFAULT_THRESHOLD_MS = 300.0
+DEFAULT_RUNS = 5
+# Loaded on first use; importing any of these with the agent is a regression.
+DEFERRED_MODULES = ('google.genai', 'pydantic', 'requests', 'httpx')
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def import_profile(module: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, depth) for every module imported by `import module`."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+    profile = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            profile.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return profile
+
+
+def measure(module: str, runs: int) -> Dict:
+    best = None
+    for _ in range(runs):
+        profile = import_profile(module)
+        total = next(cumulative for name, _, cumulative, depth in profile if name == module and depth == 0)
+        if best is None or total < best[0]:
+            best = (total, profile)
+    total, profile = best
+    # importtime prints children before their parent, so the target's imports are the
+    # lines between the previous top-level import and the target itself
+    end = next(i for i, (name, *_, depth) in enumerate(profile) if name == module and depth == 0)
+    start = max((i + 1 for i, (*_, depth) in enumerate(profile[:end]) if depth == 0), default=0)
+    own = profile[start:end + 1]
+    loaded = [name for name, *_ in own]
+    return {
+        'module': module,
+        'cumulative_ms': total / 1000,
+        'slowest': sorted(((name, cumulative / 1000) for name, _, cumulative, depth in own if depth <= 2), key=lambda x: -x[1]),
+        'deferred_loaded': sorted({d for d in DEFERRED_MODULES for name in loaded if name == d or name.startswith(d + '.')}),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default=DEFAULT_MODULE)
+    parser.add_argument('--threshold-ms', type=float, default=DEFAULT_THRESHOLD_MS)
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='fresh interpreters to start, the fastest counts')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    args = parser.parse_args(argv)
+
+    result = measure(args.module, args.runs)
+    print(f"import {result['module']}: {result['cumulative_ms']:.1f} ms (budget {args.threshold_ms:.0f} ms, best of {args.runs})")
+    for name, ms in result['slowest'][:args.top]:
+        print(f'  {ms:8.1f} ms  {name}')
+
+    failed = False
+    if result['cumulative_ms'] > args.threshold_ms:
+        print(f"FAIL: cold import of {result['module']} is over budget")
+        failed = True
+    if result['deferred_loaded']:
+        print(f"FAIL: imported eagerly: {', '.join(result['deferred_loaded'])}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+"""Local stand-in for every remote service get_response talks to.
+
+One HTTP server answers the OpenAI chat completions and Gemini generateContent endpoints
+with objects synthesized from the request's response schema (or scripted replies), and the
+Jina search, reader and embeddings, Brave and Serper endpoints with generated results.
+Each kind of endpoint sleeps according to its own latency profile, so load tests and
+benchmarks run end-to-end with no network and no keys.
+
+    python src/benchmarks/mock_server.py --port 8765 --llm-latency lognormal:-0.5,0.6 --search-latency uniform:0.2,0.8
+
+then export the variables it prints. In-process, use MockServer as a context manager and
+apply its env(); agent.SEARCH_PROVIDER still picks the search provider.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_ACTIONS = ('search', 'visit', 'answer')
+DEFAULT_RESULTS = 10
+DEFAULT_PAGE_CHARS = 8000
+HOSTS = 12
+WORDS = (
+    'research report analysis market data growth policy history capital city population government '
+    'economy science study results evidence source official annual review statistics trend region '
+    'model system network energy climate health education technology industry record survey'
+).split()
+
+
+class LatencyProfile:
+    """How long one kind of endpoint takes to answer.
+
+    Specs: `none`, `fixed:S`, `uniform:A,B`, `normal:MU,SIGMA`, `lognormal:MU,SIGMA`
+    (of the natural log of seconds) and `seq:S1,S2,...`, a scripted sequence that repeats.
+    """
+
+    def __init__(self, spec: str = 'none', rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        self.args = [float(a) for a in args.split(',') if a]
+        self._lock = threading.Lock()
+        self._sequence: Optional[Iterator[float]] = itertools.cycle(self.args) if kind == 'seq' else None
+        expected = {'none': 0, 'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+        if kind == 'seq' and not self.args or kind != 'seq' and len(self.args) != expected.get(kind, -1):
+            raise ValueError(f'Invalid latency profile: {spec}')
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == 'none':
+                return 0.0
+            if self.kind == 'fixed':
+                return self.args[0]
+            if self.kind == 'uniform':
+                return self.rng.uniform(*self.args)
+            if self.kind == 'normal':
+                return max(0.0, self.rng.gauss(*self.args))
+            if self.kind == 'lognormal':
+                return self.rng.lognormvariate(*self.args)
+            return next(self._sequence)
+
+
+def _seed(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha1('\0'.join(parts).encode('utf-8')).digest()[:8], 'big')
+
+
+def _words(rng: random.Random, count: int, extra: List[str] = ()) -> str:
+    vocabulary = WORDS + list(extra)
+    return ' '.join(rng.choice(vocabulary) for _ in range(count))
+
+
+def search_results(query: str, count: int = DEFAULT_RESULTS) -> List[Dict]:
+    """Results for a query, the same ones every time it is searched."""
+    rng = random.Random(_seed('search', query))
+    terms = re.findall(r'\w+', query.lower())
+    results = []
+    for i in range(count):
+        host = f'site{rng.randrange(HOSTS)}.example.com'
+        results.append({
+            'title': f'{query} - {_words(rng, 4, terms)}',
+            'url': f'https://{host}/{"-".join(terms[:3]) or "page"}/{i}',
+            'description': _words(rng, 30, terms),
+        })
+    return results
+
+
+def page(url: str, chars: int = DEFAULT_PAGE_CHARS) -> Dict:
+    """Reader output for a URL: about `chars` of paragraphs drawn from its path and a fixed vocabulary."""
+    rng = random.Random(_seed('read', url))
+    terms = re.findall(r'[a-z]+', urlparse(url).path.lower())
+    paragraphs, size = [], 0
+    while size < chars:
+        paragraph = _words(rng, rng.randint(40, 120), terms).capitalize() + '.'
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    content = '\n\n'.join(paragraphs)[:chars]
+    return {'title': _words(rng, 5, terms).title(), 'description': _words(rng, 20, terms), 'url': url, 'content': content, 'usage': {'tokens': len(content) // 4}, 'links': []}
+
+
+class ObjectSynthesizer:
+    """Builds an object that satisfies a response schema, JSON Schema or Gemini style.
+
+    Optional properties are left out, except the one named after the chosen `action`, so
+    an agent step gets exactly the action details it asked for.
+    """
+
+    def __init__(self, actions=DEFAULT_ACTIONS, pass_rate: float = 1.0, seed: int = 0):
+        self._actions = itertools.cycle(actions)
+        self.pass_rate = pass_rate
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def next_action(self, allowed: List[str]) -> str:
+        with self._lock:
+            for _ in range(len(allowed) * 8):
+                action = next(self._actions)
+                if action in allowed:
+                    return action
+        return allowed[0]
+
+    def synthesize(self, schema: Dict, root: Optional[Dict] = None, name: str = '') -> Any:
+        root = root or schema
+        schema = self._resolve(schema, root)
+        for key in ('anyOf', 'oneOf'):
+            if key in schema:
+                options = [o for o in schema[key] if self._type(self._resolve(o, root)) != 'null']
+                return self.synthesize(options[0], root, name) if options else None
+        schema_type = self._type(schema)
+        if schema.get('enum'):
+            return self.next_action(schema['enum']) if name == 'action' else schema['enum'][0]
+        if schema_type == 'object':
+            result: Dict[str, Any] = {}
+            properties = schema.get('properties', {})
+            for key in schema.get('required', []):
+                if key in properties:
+                    result[key] = self.synthesize(properties[key], root, key)
+            action = result.get('action')
+            if action in properties and action not in result:
+                result[action] = self.synthesize(properties[action], root, action)
+            return result
+        if schema_type == 'array':
+            low = schema.get('minItems', schema.get('min_items', 1)) or 1
+            high = schema.get('maxItems', schema.get('max_items', low))
+            return [self.synthesize(schema.get('items', {'type': 'string'}), root, name) for _ in range(min(max(int(low), 1), int(high)))]
+        if schema_type == 'boolean':
+            with self._lock:
+                return self.rng.random() < self.pass_rate
+        if schema_type in ('number', 'integer'):
+            return schema.get('minimum', 0)
+        return self._string(schema, name)
+
+    def _string(self, schema: Dict, name: str) -> str:
+        n = next(self._counter)
+        if 'url' in name.lower():
+            value = f'https://site{n % HOSTS}.example.com/page/{n}'
+        elif name == 'q':
+            value = f'mock query {n}'
+        elif name.lower() == 'datetime':
+            value = time.strftime('%Y-%m-%d')
+        else:
+            with self._lock:
+                value = _words(self.rng, 12)
+        limit = schema.get('maxLength', schema.get('max_length'))
+        return value[:int(limit)] if limit else value
+
+    @staticmethod
+    def _type(schema: Dict) -> str:
+        schema_type = schema.get('type', 'object' if 'properties' in schema else 'string')
+        if isinstance(schema_type, list):
+            schema_type = next((t for t in schema_type if t != 'null'), 'null')
+        return schema_type.lower()
+
+    @staticmethod
+    def _resolve(schema: Dict, root: Dict) -> Dict:
+        while '$ref' in schema:
+            node: Any = root
+            for part in schema['$ref'].lstrip('#/').split('/'):
+                node = node[part]
+            schema = node
+        return schema
+
+
+class MockServer:
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        llm_latency: str = 'none',
+        search_latency: str = 'none',
+        read_latency: str = 'none',
+        script: Optional[List[Dict]] = None,
+        actions=DEFAULT_ACTIONS,
+        pass_rate: float = 1.0,
+        results: int = DEFAULT_RESULTS,
+        page_chars: int = DEFAULT_PAGE_CHARS,
+        seed: int = 0,
+    ):
+        rng = random.Random(seed)
+        self.latency = {
+            'llm': LatencyProfile(llm_latency, random.Random(rng.random())),
+            'search': LatencyProfile(search_latency, random.Random(rng.random())),
+            'read': LatencyProfile(read_latency, random.Random(rng.random())),
+        }
+        # [{"match": substring of the system prompt, "response": object}], first match wins
+        self.script = script or []
+        self.synthesizer = ObjectSynthesizer(actions, pass_rate, seed)
+        self.results = results
+        self.page_chars = page_chars
+        self.counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def env(self) -> Dict[str, str]:
+        """Environment that points config, the LLM backends and the search tools here."""
+        return {
+            'LLM_PROVIDER': 'openai',
+            'OPENAI_API_KEY': 'mock',
+            'OPENAI_BASE_URL': f'{self.url}/v1',
+            'GEMINI_API_KEY': 'mock',
+            'GEMINI_BASE_URL': self.url,
+            'JINA_API_KEY': 'mock',
+            'JINA_SEARCH_URL': f'{self.url}/jina/search',
+            'JINA_READER_URL': f'{self.url}/jina/read',
+            'JINA_EMBEDDINGS_URL': f'{self.url}/jina/embeddings',
+            'BRAVE_API_KEY': 'mock',
+            'BRAVE_SEARCH_URL': f'{self.url}/brave/res/v1/web/search',
+            'SERPER_API_KEY': 'mock',
+            'SERPER_SEARCH_URL': f'{self.url}/serper/search',
+        }
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='mock-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, kind: str) -> None:
+        with self._counts_lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    # --- responses ---
+
+    def complete(self, system: str, schema: Optional[Dict]) -> Dict:
+        for entry in self.script:
+            if entry['match'] in system:
+                return entry['response']
+        if not schema:
+            return {'think': _words(random.Random(_seed(system)), 8)}
+        return self.synthesizer.synthesize(schema)
+
+    def search_results(self, query: str) -> List[Dict]:
+        return search_results(query, self.results)
+
+    def page(self, url: str) -> Dict:
+        return page(url, self.page_chars)
+
+    @staticmethod
+    def embedding(text: str, dimensions: int) -> List[float]:
+        rng = random.Random(_seed('embed', text))
+        vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _body(self) -> Dict:
+                length = int(self.headers.get('Content-Length') or 0)
+                return json.loads(self.rfile.read(length)) if length else {}
+
+            def _send(self, payload: Any, status: int = 200) -> None:
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _delay(self, kind: str) -> None:
+                server._count(kind)
+                seconds = server.latency['llm' if kind in ('openai', 'gemini') else 'read' if kind in ('read', 'embeddings') else 'search'].sample()
+                if seconds:
+                    time.sleep(seconds)
+
+            def do_GET(self) -> None:
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query).get('q', [''])[0]
+                if parsed.path == '/jina/search':
+                    self._delay('jina')
+                    data = [dict(r, content='', usage={'tokens': len(r['description']) // 4}) for r in server.search_results(query)]
+                    self._send({'code': 200, 'status': 20000, 'data': data})
+                elif parsed.path == '/brave/res/v1/web/search':
+                    self._delay('brave')
+                    self._send({'web': {'results': server.search_results(query)}})
+                elif parsed.path == '/stats':
+                    with server._counts_lock:
+                        self._send(dict(server.counts))
+                else:
+                    self._send({'error': f'Unknown endpoint {parsed.path}'}, 404)
+
+            def do_POST(self) -> None:
+                path = urlparse(self.path).path
+                body = self._body()
+                if path == '/v1/chat/completions':
+                    self._delay('openai')
+                    system = '\n'.join(m['content'] for m in body.get('messages', []) if m.get('role') == 'system')
+                    schema = (body.get('response_format') or {}).get('json_schema', {}).get('schema')
+                    text = json.dumps(server.complete(system, schema))
+                    prompt_tokens = sum(len(m.get('content') or '') for m in body.get('messages', [])) // 4
+                    completion_tokens = len(text) // 4
+                    self._send({
+                        'id': 'mock', 'object': 'chat.completion', 'model': body.get('model'),
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens},
+                    })
+                elif re.fullmatch(r'/v1(beta)?/models/[^/]+:generateContent', path):
+                    self._delay('gemini')
+                    system = '\n'.join(p.get('text', '') for p in (body.get('systemInstruction') or {}).get('parts', []))
+                    config = body.get('generationConfig') or {}
+                    text = json.dumps(server.complete(system, config.get('responseSchema') or config.get('responseJsonSchema')))
+                    prompt_tokens = len(json.dumps(body.get('contents', []))) // 4 + len(system) // 4
+                    completion_tokens = len(text) // 4
+                    self._send({
+                        'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP', 'index': 0}],
+                        'usageMetadata': {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': completion_tokens, 'totalTokenCount': prompt_tokens + completion_tokens},
+                    })
+                elif path == '/serper/search':
+                    self._delay('serper')
+                    organic = [{'title': r['title'], 'link': r['url'], 'snippet': r['description'], 'position': i + 1} for i, r in enumerate(server.search_results(body.get('q', '')))]
+                    self._send({'searchParameters': body, 'organic': organic})
+                elif path == '/jina/read':
+                    self._delay('read')
+                    self._send({'code': 200, 'status': 20000, 'data': server.page(body.get('url', ''))})
+                elif path == '/jina/embeddings':
+                    self._delay('embeddings')
+                    texts = body.get('input', [])
+                    dimensions = int(body.get('dimensions') or 1024)
+                    data = [{'object': 'embedding', 'index': i, 'embedding': server.embedding(t, dimensions)} for i, t in enumerate(texts)]
+                    tokens = sum(len(t) for t in texts) // 4
+                    self._send({'model': body.get('model'), 'object': 'list', 'data': data, 'usage': {'total_tokens': tokens, 'prompt_tokens': tokens}})
+                else:
+                    self._send({'error': f'Unknown endpoint {path}'}, 404)
+
+        return Handler
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--llm-latency', default='none', help='latency profile, e.g. fixed:0.8, uniform:0.5,2, lognormal:-0.5,0.6, seq:0.2,3')
+    parser.add_argument('--search-latency', default='none')
+    parser.add_argument('--read-latency', default='none')
+    parser.add_argument('--script', help='JSON file of [{"match": "...", "response": {...}}] replies keyed on the system prompt')
+    parser.add_argument('--actions', default=','.join(DEFAULT_ACTIONS), help='agent actions to cycle through')
+    parser.add_argument('--pass-rate', type=float, default=1.0, help='share of boolean fields (evaluations) that come back true')
+    parser.add_argument('--results', type=int, default=DEFAULT_RESULTS)
+    parser.add_argument('--page-chars', type=int, default=DEFAULT_PAGE_CHARS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    server = MockServer(
+        args.host, args.port, args.llm_latency, args.search_latency, args.read_latency,
+        script, args.actions.split(','), args.pass_rate, args.results, args.page_chars, args.seed,
+    )
+    for key, value in server.env().items():
+        print(f'export {key}={value}')
+    sys.stdout.flush()
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,136 +1,184 @@
-import os
+import functools
 import json
-import requests  # For proxy handling if needed
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
 
-# Load config.json
-try:
-    with open('config.json', 'r') as f:
-        config_json = json.load(f)
-except FileNotFoundError:
-    print("Error: config.json not found.")
-    exit(1)
+if TYPE_CHECKING:
+    from utils.llm_backends import LanguageModel
+
+logger = logging.getLogger(__name__)
 
 # Types (as close as possible in Python)
 LLMProvider = str  # 'openai' | 'gemini' | 'vertex'
 ToolName = str  # Assuming tools are string keys in configJson
 
-# Environment setup
-env = dict(config_json['env'])  # Create a copy of the env dict
+CONFIG_PATH_ENV = 'DEEPRESEARCH_CONFIG'
+# config.json sits at the repository root, next to package.json
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
 
-for key in env:
-    if os.environ.get(key):
-        env[key] = os.environ.get(key) or env[key]
 
-# Setup proxy if present
-if env.get('https_proxy'):
-    try:
-        proxy_url = requests.utils.urlparse(env['https_proxy']).geturl()  # Parse URL
-        proxies = {
-            'http': proxy_url,
-            'https': proxy_url,
-        }
-        # In Python, you'd typically configure the proxy for the requests library or
-        # any other library that makes HTTP requests.
-        # Example using requests:
-        # requests.get('some_url', proxies=proxies)
-        # Note: undici's ProxyAgent and setGlobalDispatcher are Node.js specific.
-        print(f"Proxy configured: {proxy_url}") # just print a message, as undici proxy logic cannot be directly translated.
-    except Exception as error:
-        print(f'Failed to set proxy: {error}')
-
-# Export environment variables
-OPENAI_BASE_URL = env.get('OPENAI_BASE_URL')
-GEMINI_API_KEY = env.get('GEMINI_API_KEY')
-OPENAI_API_KEY = env.get('OPENAI_API_KEY')
-JINA_API_KEY = env.get('JINA_API_KEY')
-BRAVE_API_KEY = env.get('BRAVE_API_KEY')
-SERPER_API_KEY = env.get('SERPER_API_KEY')
-SEARCH_PROVIDER = config_json['defaults']['search_provider']
-STEP_SLEEP = config_json['defaults']['step_sleep']
-
-# Determine LLM provider
-LLM_PROVIDER: LLMProvider = os.environ.get('LLM_PROVIDER') or config_json['defaults']['llm_provider']
+class ConfigError(ValueError):
+    pass
+
 
 def isValidProvider(provider: str) -> bool:
     return provider in ['openai', 'gemini', 'vertex']
 
-if not isValidProvider(LLM_PROVIDER):
-    raise ValueError(f'Invalid LLM provider: {LLM_PROVIDER}')
 
-# Get tool configuration
-def getToolConfig(toolName: ToolName) -> dict:
-    provider_config = config_json['models']['gemini'] if LLM_PROVIDER == 'vertex' else config_json['models'][LLM_PROVIDER]
-    default_config = provider_config['default']
-    tool_overrides = provider_config['tools'].get(toolName, {})
+class Config:
+    """config.json merged with the environment, validated once when loaded.
+
+    Nothing happens at import time: get_config() loads on first use and reloads only
+    when the file on disk changes.
+    """
+
+    def __init__(self, config_json: Dict[str, Any], path: Optional[str] = None, environ: Optional[Dict[str, str]] = None):
+        environ = os.environ if environ is None else environ
+        self.path = path
+        self.config_json = config_json
+        # environment variables override the env section of the file
+        self.env: Dict[str, str] = {key: environ.get(key) or value for key, value in config_json['env'].items()}
+        self.OPENAI_BASE_URL = self.env.get('OPENAI_BASE_URL')
+        self.GEMINI_API_KEY = self.env.get('GEMINI_API_KEY')
+        self.OPENAI_API_KEY = self.env.get('OPENAI_API_KEY')
+        self.JINA_API_KEY = self.env.get('JINA_API_KEY')
+        self.BRAVE_API_KEY = self.env.get('BRAVE_API_KEY')
+        self.SERPER_API_KEY = self.env.get('SERPER_API_KEY')
+        self.SEARCH_PROVIDER = environ.get('SEARCH_PROVIDER') or config_json['defaults']['search_provider']
+        self.STEP_SLEEP = config_json['defaults']['step_sleep']
+        self.LLM_PROVIDER: LLMProvider = environ.get('LLM_PROVIDER') or config_json['defaults']['llm_provider']
+        self.default_model_name = environ.get('DEFAULT_MODEL_NAME') or self.env.get('DEFAULT_MODEL_NAME')
+        self.GEMINI_BASE_URL = environ.get('GEMINI_BASE_URL')
+        self.GCLOUD_PROJECT = environ.get('GCLOUD_PROJECT')
+        self.GCLOUD_LOCATION = environ.get('GCLOUD_LOCATION')
+        self.proxies = self._proxies()
+
+    def _proxies(self) -> Optional[Dict[str, str]]:
+        if not self.env.get('https_proxy'):
+            return None
+        proxy_url = urlparse(self.env['https_proxy']).geturl()
+        # pass these to requests (proxies=...); undici's global dispatcher has no Python equivalent
+        return {'http': proxy_url, 'https': proxy_url}
+
+    def validate(self) -> 'Config':
+        if not isValidProvider(self.LLM_PROVIDER):
+            raise ConfigError(f'Invalid LLM provider: {self.LLM_PROVIDER}')
+        if self.LLM_PROVIDER == 'gemini' and not self.GEMINI_API_KEY:
+            raise ConfigError('GEMINI_API_KEY not found')
+        if self.LLM_PROVIDER == 'openai' and not self.OPENAI_API_KEY:
+            raise ConfigError('OPENAI_API_KEY not found')
+        if not self.JINA_API_KEY:
+            raise ConfigError('JINA_API_KEY not found')
+        return self
+
+    def _provider_models(self) -> Dict[str, Any]:
+        return self.config_json['models']['gemini' if self.LLM_PROVIDER == 'vertex' else self.LLM_PROVIDER]
+
+    # Get tool configuration
+    def getToolConfig(self, toolName: ToolName) -> dict:
+        provider_config = self._provider_models()
+        default_config = provider_config['default']
+        tool_overrides = provider_config['tools'].get(toolName, {})
+
+        return {
+            # a model set for the tool wins, so cheap tools can run on a smaller model than the agent
+            'model': tool_overrides.get('model') or self.default_model_name or default_config['model'],
+            'temperature': tool_overrides.get('temperature', default_config['temperature']),
+            'maxTokens': tool_overrides.get('maxTokens', default_config['maxTokens'])
+        }
 
-    return {
-        'model': os.environ.get('DEFAULT_MODEL_NAME') or default_config['model'],
-        'temperature': tool_overrides.get('temperature', default_config['temperature']),
-        'maxTokens': tool_overrides.get('maxTokens', default_config['maxTokens'])
-    }
+    def getMaxTokens(self, toolName: ToolName) -> int:
+        return self.getToolConfig(toolName)['maxTokens']
+
+    # Get model instance
+    def getModel(self, toolName: ToolName) -> 'LanguageModel':
+        from utils.llm_backends import LanguageModel, get_backend
+
+        if self.LLM_PROVIDER == 'openai' and not self.OPENAI_API_KEY:
+            raise ConfigError('OPENAI_API_KEY not found')
+        if self.LLM_PROVIDER == 'gemini' and not self.GEMINI_API_KEY:
+            raise ConfigError('GEMINI_API_KEY not found')
+        return LanguageModel(get_backend(self), self.getToolConfig(toolName)['model'])
+
+    @functools.cached_property
+    def config_summary(self) -> Dict[str, Any]:
+        return {
+            'provider': {
+                'name': self.LLM_PROVIDER,
+                'model': self.config_json['models']['openai']['default']['model'] if self.LLM_PROVIDER == 'openai' else self.config_json['models']['gemini']['default']['model'],
+                'baseUrl': self.OPENAI_BASE_URL if self.LLM_PROVIDER == 'openai' else None
+            },
+            'search': {
+                'provider': self.SEARCH_PROVIDER
+            },
+            'tools': {
+                name: self.getToolConfig(name)
+                for name in self._provider_models()['tools']
+            },
+            'defaults': {
+                'stepSleep': self.STEP_SLEEP
+            }
+        }
 
-def getMaxTokens(toolName: ToolName) -> int:
-    return getToolConfig(toolName)['maxTokens']
 
-# Get model instance (replace with your actual AI SDK logic)
-def getModel(toolName: ToolName):
-    config = getToolConfig(toolName)
-    provider_config = config_json['providers'].get(LLM_PROVIDER)
+def resolve_config_path(path: Optional[str] = None) -> str:
+    return os.path.abspath(path or os.environ.get(CONFIG_PATH_ENV) or DEFAULT_CONFIG_PATH)
 
-    if LLM_PROVIDER == 'openai':
-        if not OPENAI_API_KEY:
-            raise ValueError('OPENAI_API_KEY not found')
 
-        opt = {
-            'apiKey': OPENAI_API_KEY,
-            'compatibility': provider_config.get('clientConfig', {}).get('compatibility')
-        }
+# path -> (mtime_ns, config, validated) of the latest load; an edit replaces the entry
+_configs: Dict[str, Tuple[int, Config, bool]] = {}
+_configs_lock = threading.Lock()
+
 
-        if OPENAI_BASE_URL:
-            opt['baseURL'] = OPENAI_BASE_URL
-
-        # Replace with your actual OpenAI SDK call
-        print(f"OpenAI model requested: {config['model']}")
-        return config['model'] # placeholder, return model name for now
-
-    elif LLM_PROVIDER == 'vertex':
-        # Replace with your actual Vertex AI SDK call
-        print(f"Vertex AI model requested: {config['model']}")
-        return config['model'] # placeholder, return model name for now
-
-    else:  # Gemini
-        if not GEMINI_API_KEY:
-            raise ValueError('GEMINI_API_KEY not found')
-
-        # Replace with your actual Gemini SDK call
-        print(f"Gemini model requested: {config['model']}")
-        return config['model'] # placeholder, return model name for now
-
-# Validate required environment variables
-if LLM_PROVIDER == 'gemini' and not GEMINI_API_KEY:
-    raise ValueError('GEMINI_API_KEY not found')
-if LLM_PROVIDER == 'openai' and not OPENAI_API_KEY:
-    raise ValueError('OPENAI_API_KEY not found')
-if not JINA_API_KEY:
-    raise ValueError('JINA_API_KEY not found')
-
-# Log all configurations
-config_summary = {
-    'provider': {
-        'name': LLM_PROVIDER,
-        'model': config_json['models']['openai']['default']['model'] if LLM_PROVIDER == 'openai' else config_json['models']['gemini']['default']['model'],
-        'baseUrl': OPENAI_BASE_URL if LLM_PROVIDER == 'openai' else None
-    },
-    'search': {
-        'provider': SEARCH_PROVIDER
-    },
-    'tools': {
-        name: getToolConfig(name)
-        for name in config_json['models']['gemini' if LLM_PROVIDER == 'vertex' else LLM_PROVIDER]['tools']
-    },
-    'defaults': {
-        'stepSleep': STEP_SLEEP
-    }
-}
-
-print('Configuration Summary:', json.dumps(config_summary, indent=2))
\ No newline at end of file
+def _load_config(path: str) -> Config:
+    try:
+        with open(path, 'r') as f:
+            config_json = json.load(f)
+    except FileNotFoundError:
+        raise ConfigError(f'config.json not found at {path}') from None
+    config = Config(config_json, path)
+    if config.proxies:
+        logger.info('Proxy configured: %s', config.proxies['https'])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('Configuration Summary: %s', json.dumps(config.config_summary, indent=2))
+    return config
+
+
+def get_config(path: Optional[str] = None, validate: bool = True) -> Config:
+    """The config at `path`, $DEEPRESEARCH_CONFIG or the repository's config.json.
+
+    Costs one stat() once loaded; the file is parsed and validated again only after it changed.
+    """
+    path = resolve_config_path(path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise ConfigError(f'config.json not found at {path}') from None
+    entry = _configs.get(path)
+    if entry is None or entry[0] != mtime_ns:
+        with _configs_lock:
+            entry = _configs.get(path)
+            if entry is None or entry[0] != mtime_ns:
+                entry = _configs[path] = (mtime_ns, _load_config(path), False)
+    mtime_ns, config, validated = entry
+    if validate and not validated:
+        # callers that skip validation share the same instance
+        config.validate()
+        with _configs_lock:
+            if _configs.get(path) is entry:
+                _configs[path] = (mtime_ns, config, True)
+    return config
+
+
+def __getattr__(name: str) -> Any:
+    # module-level names of the old eager config (config.SEARCH_PROVIDER, config.getToolConfig...) load on first access
+    if name.startswith('__'):
+        raise AttributeError(name)
+    config = get_config()
+    try:
+        return getattr(config, name)
+    except AttributeError:
+        raise AttributeError(f"module 'config' has no attribute '{name}'") from None
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules import each other from src/, as when an entry point there runs
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
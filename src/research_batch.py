@@ -0,0 +1,134 @@
+"""Research many questions at once, streaming one JSON line per question as it completes.
+
+    python src/research_batch.py src/evals/ego-questions.json --concurrency 4 --output results.jsonl
+
+The questions of a batch run on one ResearchPool, so they share its provider limits, the
+LLM and HTTP connection pools and the question profile and query rewrite caches. On top
+of that they share their searches and page reads: a sub-query or URL another question is
+fetching, or fetched recently, is not fetched again (utils/shared_calls.py), and
+identical questions are researched once.
+
+The URL store (allURLs) stays per question. Its URLs are weighted, filtered and capped
+for that question, they end up in its prompts and its checkpoint, and the session cap
+evicts them; shared, one question's URLs would crowd out and leak into another's. What
+sharing it would save, the search and read calls behind it, is already shared above.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import Future, as_completed
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from research_pool import ResearchPool  # noqa: E402
+from utils import shared_calls  # noqa: E402
+from utils.log_tools import configure_logging  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TOKEN_BUDGET = 1_000_000
+
+
+def load_questions(path: str) -> List[str]:
+    """Questions from a JSON list of {"question": ...} or strings, JSON lines, or one per line; '-' reads stdin."""
+    text = sys.stdin.read() if path == '-' else open(path, encoding='utf-8').read()
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        items = json.loads(text)
+    elif stripped.startswith('{'):
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = [line.strip() for line in text.splitlines() if line.strip()]
+    return [item['question'] if isinstance(item, dict) else item for item in items]
+
+
+def _record(index: int, question: str, future: Future, started: float) -> Dict[str, Any]:
+    record: Dict[str, Any] = {'index': index, 'question': question, 'elapsedSeconds': round(time.monotonic() - started, 3)}
+    error = future.exception()
+    if error is not None:
+        record['error'] = f'{type(error).__name__}: {error}'
+        return record
+    result = future.result()
+    record.update({
+        'answer': result['answer'],
+        'references': result['references'],
+        'isFinal': result['isFinal'],
+        'steps': result['context']['actionTracker'].get_state()['totalStep'],
+        'tokens': result['context']['tokenTracker'].get_total_usage()['totalTokens'],
+    })
+    return record
+
+
+def research_batch(
+    questions: List[str],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    output: Optional[TextIO] = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    limits: Optional[Dict[str, int]] = None,
+    **kwargs: Any,
+) -> Iterator[Dict[str, Any]]:
+    """Researches `questions` `concurrency` at a time, yielding a record per question as it completes.
+
+    Records are in completion order and carry the question's `index`; each is also written
+    to `output` as a JSON line and flushed. Nothing runs until the first record is asked
+    for. Other keyword arguments go to get_response.
+    """
+    started = time.monotonic()
+    indexes: Dict[str, List[int]] = {}
+    for index, question in enumerate(questions):
+        indexes.setdefault(question.strip(), []).append(index)
+    shared = shared_calls.SharedCalls()
+    pool = ResearchPool(workers=concurrency, max_queued=max(1, len(indexes)), limits=limits)
+    # jobs run in a copy of this context, bound to the batch's shared calls
+    token = shared_calls.bind(shared)
+    try:
+        futures = {pool.submit(question, tenant='batch', token_budget=token_budget, **kwargs): question for question in indexes}
+    finally:
+        shared_calls.unbind(token)
+    try:
+        for future in as_completed(futures):
+            question = futures[future]
+            for index in indexes[question]:
+                record = _record(index, question, future, started)
+                if output is not None:
+                    output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    output.flush()
+                yield record
+    finally:
+        # a consumer that stops early drops the questions not started yet
+        pool.shutdown(cancel_queued=True)
+        logger.info('Batch of %d questions done in %.1fs: %s', len(questions), time.monotonic() - started,
+                    {'pool': pool.stats(), 'sharedCalls': shared.stats()})
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('questions', help='JSON list of {"question": ...} or of strings, JSON lines, or one question per line; - for stdin')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='questions researched at the same time')
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET, help='per question')
+    parser.add_argument('--output', help='JSON lines file, default stdout')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args(argv)
+
+    configure_logging(args.log_level)
+    questions = load_questions(args.questions)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    failed = 0
+    try:
+        for record in research_batch(questions, args.concurrency, output, args.token_budget):
+            failed += 'error' in record
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional
+
+import agent
+from research_session import ResearchSession
+from utils import admission
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_QUEUED = 256
+# in-flight calls across all sessions of a pool, per resource type
+DEFAULT_LIMITS = {admission.LLM: 16, admission.SEARCH: 8, admission.READ: 16}
+# queue waits kept for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+
+class QueueFullError(RuntimeError):
+    """The job was refused: the pool's queue, or its tenant's share of it, is full."""
+
+
+class ResearchJob:
+    def __init__(self, tenant: str, question: str, token_budget: int, kwargs: Dict[str, Any]):
+        self.tenant = tenant
+        self.question = question
+        self.token_budget = token_budget
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        # the job runs in a copy of the submitter's context: its span, its batch's shared calls
+        self.context = contextvars.copy_context()
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.session: Optional[ResearchSession] = None
+
+    def progress(self) -> float:
+        """Share of the token budget spent, the slot priority: the closer to done, the sooner it goes."""
+        session = self.session
+        if session is None:
+            return 0.0
+        return session.token_tracker.get_total_usage()['totalTokens'] / self.token_budget
+
+
+class ResearchPool:
+    """Runs get_response for many tenants on a fixed set of workers.
+
+    Jobs wait in a bounded queue, one per tenant, and workers take them from the tenants
+    in turn, so a tenant submitting a burst cannot starve the others. Every session of the
+    pool shares one set of in-flight limits on LLM calls, searches and page reads
+    (utils/admission.py); when a limit is reached the sessions closest to finishing get
+    the next slot.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        max_queued: int = DEFAULT_MAX_QUEUED,
+        max_queued_per_tenant: Optional[int] = None,
+        limits: Optional[Dict[str, int]] = None,
+    ):
+        self.max_queued = max_queued
+        self.max_queued_per_tenant = max_queued_per_tenant or max_queued
+        self.limits = admission.ResourceLimits(DEFAULT_LIMITS if limits is None else limits)
+        # tenant -> queued jobs, in the order tenants are served
+        self._queues: 'OrderedDict[str, Deque[ResearchJob]]' = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._workers = [threading.Thread(target=self._work, name=f'research-{i}', daemon=True) for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, question: str, tenant: str = 'default', token_budget: int = 1_000_000, **kwargs: Any) -> Future:
+        """Queues a get_response call, returning a Future of its result.
+
+        Raises QueueFullError rather than blocking when the queue is full, so callers can
+        shed or retry the load themselves.
+        """
+        job = ResearchJob(tenant, question, token_budget, kwargs)
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('ResearchPool is shut down')
+            queue = self._queues.get(tenant)
+            if self._queued >= self.max_queued or (queue is not None and len(queue) >= self.max_queued_per_tenant):
+                self._rejected += 1
+                raise QueueFullError(f'Research queue full ({self._queued} queued), job from tenant {tenant} refused')
+            if queue is None:
+                queue = self._queues[tenant] = deque()
+            queue.append(job)
+            self._queued += 1
+            self._condition.notify()
+        return job.future
+
+    def _next_job(self) -> Optional[ResearchJob]:
+        # called with the condition held; the tenant served goes to the back of the line
+        while self._queues:
+            tenant, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(tenant)
+            else:
+                del self._queues[tenant]
+            if job.future.set_running_or_notify_cancel():
+                return job
+        return None
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                    job = self._next_job()
+                job.started_at = time.monotonic()
+                waited = job.started_at - job.enqueued_at
+                self._waits.append(waited)
+                self._wait_seconds += waited
+                self._max_wait_seconds = max(self._max_wait_seconds, waited)
+                self._running += 1
+            job.context.run(self._run, job)
+
+    def _run(self, job: ResearchJob) -> None:
+        token = admission.bind(self.limits, job.progress)
+        try:
+            # inside the try: a session that cannot be set up fails its job, not the worker
+            job.session = ResearchSession(job.token_budget, job.kwargs.pop('existing_context', None))
+            result = agent.get_response(job.question, token_budget=job.token_budget, session=job.session, **job.kwargs)
+        except Exception as error:
+            logger.exception('Research job from tenant %s failed', job.tenant)
+            with self._condition:
+                self._running -= 1
+                self._failed += 1
+            job.future.set_exception(error)
+        else:
+            with self._condition:
+                self._running -= 1
+                self._completed += 1
+            job.future.set_result(result)
+        finally:
+            admission.unbind(token)
+            if job.session is not None:
+                job.session.close()
+                job.session = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            waits = sorted(self._waits)
+            started = self._completed + self._failed + self._running
+            return {
+                'queueDepth': self._queued,
+                'queueDepthByTenant': {tenant: len(queue) for tenant, queue in self._queues.items()},
+                'running': self._running,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'queueWait': {
+                    'count': started,
+                    'totalSeconds': round(self._wait_seconds, 4),
+                    'meanSeconds': round(self._wait_seconds / started, 4) if started else 0.0,
+                    'p50Seconds': round(_percentile(waits, 0.5), 4),
+                    'p95Seconds': round(_percentile(waits, 0.95), 4),
+                    'maxSeconds': round(self._max_wait_seconds, 4),
+                },
+                'resources': self.limits.stats(),
+            }
+
+    def render(self) -> str:
+        """stats() in the Prometheus text format, to serve next to the span metrics."""
+        stats = self.stats()
+        lines = [
+            '# TYPE deepresearch_pool_queue_depth gauge',
+            f"deepresearch_pool_queue_depth {stats['queueDepth']}",
+            '# TYPE deepresearch_pool_tenant_queue_depth gauge',
+            *(f'deepresearch_pool_tenant_queue_depth{{tenant="{tenant}"}} {depth}' for tenant, depth in stats['queueDepthByTenant'].items()),
+            '# TYPE deepresearch_pool_running gauge',
+            f"deepresearch_pool_running {stats['running']}",
+            '# TYPE deepresearch_pool_jobs_total counter',
+            *(f'deepresearch_pool_jobs_total{{outcome="{outcome}"}} {stats[outcome]}' for outcome in ('completed', 'failed', 'rejected')),
+            '# TYPE deepresearch_pool_queue_wait_seconds summary',
+            f"deepresearch_pool_queue_wait_seconds{{quantile=\"0.5\"}} {stats['queueWait']['p50Seconds']}",
+            f"deepresearch_pool_queue_wait_seconds{{quantile=\"0.95\"}} {stats['queueWait']['p95Seconds']}",
+            f"deepresearch_pool_queue_wait_seconds_sum {stats['queueWait']['totalSeconds']}",
+            f"deepresearch_pool_queue_wait_seconds_count {stats['queueWait']['count']}",
+        ]
+        for metric, kind, key in (('resource_in_use', 'gauge', 'inUse'), ('resource_waiting', 'gauge', 'waiting'), ('resource_wait_seconds_total', 'counter', 'waitSeconds')):
+            lines.append(f'# TYPE deepresearch_pool_{metric} {kind}')
+            lines.extend(f'deepresearch_pool_{metric}{{resource="{resource}"}} {resource_stats[key]}' for resource, resource_stats in stats['resources'].items())
+        return '\n'.join(lines) + '\n'
+
+    def shutdown(self, wait: bool = True, cancel_queued: bool = False) -> None:
+        """Stops taking jobs; queued jobs still run unless `cancel_queued`."""
+        with self._condition:
+            self._closed = True
+            if cancel_queued:
+                for queue in self._queues.values():
+                    for job in queue:
+                        job.future.cancel()
+                self._queues.clear()
+                self._queued = 0
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self) -> 'ResearchPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.shutdown()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
@@ -0,0 +1,151 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from action_types import ActionTracker, TokenTracker
+from utils.checkpoint import SessionCheckpoint
+from utils.passage_index import HashingEmbedder, JinaEmbedder, PassageIndex
+
+# Defaults sized for a 1M token budget; a session hitting them is already far past useful.
+MAX_CONTEXT_ITEMS = 200
+MAX_KNOWLEDGE_ITEMS = 200
+MAX_URLS = 2000
+MAX_DIARY_ITEMS = 100
+
+
+class ResearchSession:
+    """State of a single get_response call.
+
+    Owns everything that used to live in module globals or loose locals, so concurrent
+    sessions never share context and a closed session releases its memory.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1_000_000,
+        existing_context: Optional[Dict] = None,
+        max_context_items: int = MAX_CONTEXT_ITEMS,
+        max_knowledge_items: int = MAX_KNOWLEDGE_ITEMS,
+        max_urls: int = MAX_URLS,
+        max_diary_items: int = MAX_DIARY_ITEMS,
+        embedder=None,
+    ):
+        self.token_tracker: TokenTracker = existing_context and existing_context.get("tokenTracker") or TokenTracker(token_budget)
+        # a tracker handed over by the caller already counts what was spent before
+        self._own_tracker = not (existing_context and existing_context.get("tokenTracker"))
+        self.action_tracker: ActionTracker = existing_context and existing_context.get("actionTracker") or ActionTracker()
+        self._own_action_tracker = not (existing_context and existing_context.get("actionTracker"))
+        # stores opened here from a path, closed with the session; instances stay the caller's
+        self._own_stores: List[Any] = []
+        checkpoint = existing_context and existing_context.get("checkpoint")
+        self.checkpoint: Optional[SessionCheckpoint] = SessionCheckpoint(checkpoint) if isinstance(checkpoint, str) else checkpoint
+        jina_api_key = os.environ.get("JINA_API_KEY")
+        self.embedder = embedder or (JinaEmbedder(jina_api_key, self.token_tracker) if jina_api_key else HashingEmbedder())
+        embedding_store = (existing_context or {}).get("embeddingStore")
+        if embedding_store is not None:
+            from utils.embedding_store import CachedEmbedder, EmbeddingStore
+        if isinstance(embedding_store, str):
+            embedding_store = EmbeddingStore(embedding_store, self.embedder.dimensions)
+            self._own_stores.append(embedding_store)
+        if embedding_store is not None:
+            self.embedder = CachedEmbedder(self.embedder, embedding_store)
+        self.knowledge_store = (existing_context or {}).get("knowledgeStore")
+        if isinstance(self.knowledge_store, str):
+            from utils.knowledge_store import KnowledgeStore
+            self.knowledge_store = KnowledgeStore(self.knowledge_store)
+            self._own_stores.append(self.knowledge_store)
+        self.max_context_items = max_context_items
+        self.max_knowledge_items = max_knowledge_items
+        self.max_urls = max_urls
+        self.max_diary_items = max_diary_items
+        self.closed = False
+        self._reset_state()
+
+    def _reset_state(self) -> None:
+        self.all_context: List[Dict] = []
+        self.all_knowledge: List[Dict] = []
+        self.all_urls: Dict[str, Dict] = {}
+        self.visited_urls: List[str] = []
+        self.diary_context: List[str] = []
+        self.passage_index = PassageIndex(self.embedder)
+
+    @property
+    def context(self) -> Dict[str, Any]:
+        return {"tokenTracker": self.token_tracker, "actionTracker": self.action_tracker}
+
+    def restore_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """Loads the checkpoint into this session, returning the replayed log for the loop state."""
+        if not self.checkpoint:
+            return None
+        restored = self.checkpoint.load()
+        if restored is None:
+            return None
+        self.all_context[:] = restored["allContext"]
+        self.all_knowledge[:] = restored["allKnowledge"]
+        self.visited_urls[:] = restored["visitedURLs"]
+        self.diary_context[:] = restored["diaryContext"]
+        self.all_urls.clear()
+        self.all_urls.update(restored["allURLs"])
+        usage = restored["state"].get("tokenUsage")
+        if usage and usage["totalTokens"] and self._own_tracker:
+            # tokens spent before the crash still count against the budget
+            self.token_tracker.track_usage("checkpoint", usage)
+        return restored
+
+    def update_context(self, step: Dict) -> None:
+        self.all_context.append(step)
+
+    def enforce_caps(self) -> None:
+        """Trims every container in place, oldest first, so callers holding references stay valid."""
+        if len(self.all_context) > self.max_context_items:
+            del self.all_context[:len(self.all_context) - self.max_context_items]
+        if len(self.diary_context) > self.max_diary_items:
+            del self.diary_context[:len(self.diary_context) - self.max_diary_items]
+        if len(self.all_knowledge) > self.max_knowledge_items:
+            self._evict_knowledge(len(self.all_knowledge) - self.max_knowledge_items)
+        if len(self.all_urls) > self.max_urls:
+            visited = set(self.visited_urls)
+            # dicts keep insertion order, drop the oldest unvisited URLs first
+            stale = [url for url in self.all_urls if url not in visited]
+            for url in stale[:len(self.all_urls) - self.max_urls]:
+                del self.all_urls[url]
+
+    def _evict_knowledge(self, count: int) -> None:
+        # search snippets are the cheapest to get back, drop them before answers and page reads
+        side_info = [i for i, k in enumerate(self.all_knowledge) if k.get("type") == "side-info"][:count]
+        evict = set(side_info)
+        if len(evict) < count:
+            rest = [i for i in range(len(self.all_knowledge)) if i not in evict]
+            evict.update(rest[:count - len(evict)])
+        self.all_knowledge[:] = [k for i, k in enumerate(self.all_knowledge) if i not in evict]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "context": len(self.all_context),
+            "knowledge": len(self.all_knowledge),
+            "urls": len(self.all_urls),
+            "visitedUrls": len(self.visited_urls),
+            "diary": len(self.diary_context),
+            "passages": len(self.passage_index),
+        }
+
+    def close(self) -> None:
+        """Releases the session's memory, the event threads of its trackers and the stores it opened."""
+        if self.closed:
+            return
+        # rebind rather than clear, results already handed out keep their lists
+        self._reset_state()
+        self.closed = True
+        # trackers handed out in results still count, they only stop feeding listeners
+        if self._own_tracker:
+            self.token_tracker.close()
+        if self._own_action_tracker:
+            self.action_tracker.close()
+        for store in self._own_stores:
+            store.close()
+        self._own_stores = []
+
+    def __enter__(self) -> 'ResearchSession':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,58 @@
+import pytest
+
+from tools.code_sandbox import SandboxPool, SandboxUnavailable
+
+
+@pytest.fixture(scope='module')
+def pool():
+    try:
+        pool = SandboxPool(size=1)
+    except SandboxUnavailable as error:
+        pytest.skip(f'no sandbox isolation here: {error}')
+    yield pool
+    pool.close()
+
+
+def test_runs_code_against_the_session_data(pool):
+    with pool.session({'numbers': [1, 2, 3]}) as sandbox:
+        assert sandbox.run('return sum(numbers)')['output'] == 6
+
+
+def test_sees_nothing_of_the_host(pool):
+    with pool.session({}) as sandbox:
+        assert 'FileNotFoundError' in sandbox.run("return open('/etc/passwd').read()")['error']
+        assert not {'etc', 'proc', 'dev', 'home', 'data'} & set(sandbox.run("import os\nreturn os.listdir('/')")['output'])
+        assert 'Read-only' in sandbox.run("open('/x', 'w').write('x')\nreturn 1")['error']
+
+
+def test_refuses_network_and_processes(pool):
+    with pool.session({}) as sandbox:
+        assert 'not allowed' in sandbox.run('import socket\nreturn socket.socket()')['error']
+        assert 'not allowed' in sandbox.run('import os\nreturn os.fork()')['error']
+        assert 'not allowed' in sandbox.run('import ctypes\nreturn 1')['error']
+
+
+def test_sessions_never_share_a_worker(pool):
+    with pool.session({'secret': 'tenant-A-data'}) as sandbox:
+        assert sandbox.run('return secret')['output'] == 'tenant-A-data'
+        first = sandbox.run("import os\nreturn os.getpid()")['output']
+        sandbox.run("import __main__\n__main__.run = lambda code, variables: 'poisoned'\nreturn 1")
+    for _ in range(3):
+        with pool.session({'numbers': [9]}) as sandbox:
+            probe = (
+                "import gc, os\n"
+                "leaked = any('tenant-A' in repr(o) for o in gc.get_objects() if isinstance(o, (str, dict)))\n"
+                "return [os.getpid(), leaked, sum(numbers)]"
+            )
+            pid, leaked, total = sandbox.run(probe)['output']
+            assert pid != first
+            assert not leaked
+            assert total == 9
+
+
+def test_recovers_from_crash_and_timeout(pool):
+    with pool.session({'numbers': [1, 2]}) as sandbox:
+        assert 'exited with code 3' in sandbox.run('import os\nos._exit(3)')['error']
+        assert sandbox.run('return sum(numbers)')['output'] == 3
+        assert 'timed out' in sandbox.run('while True: pass', timeout=1)['error']
+        assert sandbox.run('return numbers')['output'] == [1, 2]
@@ -0,0 +1,19 @@
+import os
+from typing import Dict
+
+from utils.http_session import get_session
+
+DEFAULT_URL = 'https://api.search.brave.com/res/v1/web/search'
+TIMEOUT_SECONDS = 10
+
+
+def brave_search(query: str) -> Dict:
+    response = get_session().get(
+        os.environ.get('BRAVE_SEARCH_URL') or DEFAULT_URL,
+        params={'q': query, 'count': 10, 'safesearch': 'off'},
+        headers={'Accept': 'application/json', 'X-Subscription-Token': os.environ.get('BRAVE_API_KEY', '')},
+        timeout=TIMEOUT_SECONDS,
+    )
+    response.raise_for_status()
+    # Maintain the same return structure as the original code
+    return {'response': response.json()}
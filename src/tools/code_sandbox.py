@@ -0,0 +1,359 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import pickle
+import queue
+import select
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.log_tools import truncate
+
+logger = logging.getLogger(__name__)
+
+TOOL_NAME = 'coder'
+HEADER = struct.Struct('>I')
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+POOL_SIZE = 2
+RUN_TIMEOUT_SECONDS = 5.0
+START_TIMEOUT_SECONDS = 10.0
+
+
+class SandboxError(Exception):
+    pass
+
+
+class SandboxUnavailable(SandboxError):
+    """The worker could not isolate itself, so no generated code runs."""
+
+
+def get_prompt(problem: str, available_vars: str, previous_attempts: List[Dict[str, str]] = []) -> Dict[str, str]:
+    previous_attempts_context = '\n'.join(
+        f"""
+<bad-attempt-{index + 1}>
+{attempt['code']}
+{f'''Error: {attempt['error']}
+</bad-attempt-{index + 1}>
+''' if attempt.get('error') else ''}
+"""
+        for index, attempt in enumerate(previous_attempts)
+    )
+    previous = f"""Previous attempts and their errors:
+{previous_attempts_context}
+""" if previous_attempts else ''
+
+    prompt = f"""You are an expert Python programmer. Your task is to generate Python code to solve the given problem.
+
+<rules>
+1. Generate plain Python code that returns the result directly with a `return` statement
+2. You can access any of these available variables directly:
+{available_vars}
+3. You only have the Python standard library, no third party packages, no network and no subprocesses, so you must write complete, self-contained code.
+</rules>
+
+{previous}
+
+<example>
+Available variables:
+numbers (list[int]) e.g. [1, 2, 3, 4, 5, 6]
+threshold (int) e.g. 4
+
+Problem: Sum all numbers above threshold
+
+Response:
+{{
+  "code": "return sum(n for n in numbers if n > threshold)"
+}}
+</example>"""
+
+    logger.debug('Coding prompt %s', truncate(prompt))
+
+    return {'system': prompt, 'user': problem}
+
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return 'None'
+    if isinstance(value, str):
+        cleaned = ' '.join(value.split())
+        return f'"{cleaned[:47]}..."' if len(cleaned) > 50 else f'"{cleaned}"'
+    if isinstance(value, (bool, int, float)):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return f'"{value.isoformat()}"'
+    return ''
+
+
+def analyze_structure(value: Any, indent: str = '') -> str:
+    if value is None:
+        return 'None'
+    if callable(value):
+        return 'function'
+    if isinstance(value, list):
+        if not value:
+            return 'list'
+        return f'list[{analyze_structure(value[0], indent + "  ")}]'
+    if isinstance(value, dict):
+        if not value:
+            return 'dict'
+        properties = ',\n'.join(f'{indent}  "{key}": {analyze_structure(val, indent + "  ")}' for key, val in value.items())
+        return f'{{\n{properties}\n{indent}}}'
+    formatted = format_value(value)
+    return f'{type(value).__name__}{f" (example: {formatted})" if formatted else ""}'
+
+
+class _Worker:
+    def __init__(self, workdir: str):
+        self.process = subprocess.Popen(
+            [sys.executable, '-I', WORKER_SCRIPT, workdir],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=workdir,
+            env={},
+        )
+        try:
+            ready = self.request(None, START_TIMEOUT_SECONDS)
+        except BaseException:
+            self.kill()
+            raise
+        if not ready.get('ready'):
+            self.kill()
+            raise SandboxUnavailable(ready.get('error', 'Sandbox worker did not start'))
+
+    def load(self, payload: bytes) -> None:
+        """Sends the pickled data the worker runs code against, once, before its first request."""
+        loaded = self._send(payload, START_TIMEOUT_SECONDS)
+        if not loaded.get('loaded'):
+            raise SandboxError(loaded.get('error', 'Sandbox worker could not load the data'))
+
+    def request(self, message: Optional[Dict], timeout: float) -> Dict:
+        return self._send(json.dumps(message).encode('utf-8') if message is not None else None, timeout)
+
+    def _send(self, body: Optional[bytes], timeout: float) -> Dict:
+        if body is not None:
+            self.process.stdin.write(HEADER.pack(len(body)) + body)
+            self.process.stdin.flush()
+        deadline = time.monotonic() + timeout
+        size = HEADER.unpack(self._read(HEADER.size, deadline))[0]
+        return json.loads(self._read(size, deadline))
+
+    def _read(self, size: int, deadline: float) -> bytes:
+        fd = self.process.stdout.fileno()
+        chunks: List[bytes] = []
+        while size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise TimeoutError
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise SandboxError(f'Sandbox worker exited with code {self.process.wait()}')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+class SandboxPool:
+    """Pre-started, restricted Python workers that run generated code.
+
+    Workers start isolated and empty (see tools/sandbox_worker.py) and wait warm until a
+    caller takes one with session(). The caller's data is pickled and sent over the
+    worker's pipe, the worker runs only that caller's code and is killed when the caller
+    is done; a fresh worker takes its place. No worker ever sees the data or the state left
+    by code of another caller. Raises SandboxUnavailable when the workers cannot isolate
+    themselves.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.workdir = tempfile.mkdtemp(prefix='sandbox-')
+        # where each worker mounts its own root, nothing of the host is shared with them
+        os.mkdir(os.path.join(self.workdir, 'root'))
+        self._idle: 'queue.Queue[_Worker]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # workers that died and could not be restarted, started again on the next take
+        self._missing = 0
+        try:
+            for _ in range(size):
+                self._idle.put(_Worker(self.workdir))
+        except BaseException:
+            self.close()
+            raise
+
+    def session(self, data: Dict[str, Any]) -> 'SandboxSession':
+        """A worker of its own for the caller, holding `data`, until the session is closed."""
+        if self._closed:
+            raise SandboxError('Sandbox pool is closed')
+        return SandboxSession(self, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _take(self) -> _Worker:
+        with self._lock:
+            restart = self._missing > 0
+            if restart:
+                self._missing -= 1
+        if not restart:
+            return self._idle.get()
+        try:
+            return _Worker(self.workdir)
+        except BaseException:
+            with self._lock:
+                self._missing += 1
+            raise
+
+    def _retire(self, worker: _Worker) -> None:
+        # a worker is never handed out twice; its replacement starts off the caller's thread
+        worker.kill()
+        threading.Thread(target=self._refill, name='sandbox-refill', daemon=True).start()
+
+    def _refill(self) -> None:
+        try:
+            worker = _Worker(self.workdir)
+        except (SandboxError, OSError) as error:
+            logger.error('Could not restart a sandbox worker: %s', error)
+            with self._lock:
+                self._missing += 1
+            return
+        self._idle.put(worker)
+        if self._closed:
+            self._drain()
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            worker.kill()
+
+    def close(self) -> None:
+        self._closed = True
+        self._drain()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class SandboxSession:
+    """One worker of a SandboxPool, given to a single caller and its data.
+
+    The worker is taken on the first run and killed by close(). A run that times out or
+    crashes costs the worker; the next run gets a fresh one loaded with the same data.
+    """
+
+    def __init__(self, pool: SandboxPool, payload: bytes):
+        self.pool = pool
+        self._payload = payload
+        self._worker: Optional[_Worker] = None
+
+    def run(self, code: str, timeout: float = RUN_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        if self.pool._closed:
+            raise SandboxError('Sandbox pool is closed')
+        try:
+            if self._worker is None:
+                self._worker = self.pool._take()
+                self._worker.load(self._payload)
+            return self._worker.request({'code': code, 'timeout': timeout}, timeout)
+        except TimeoutError:
+            self.close()
+            return {'success': False, 'error': f'Execution timed out after {timeout} seconds'}
+        except (SandboxError, OSError) as error:
+            # a crashed worker shows up as a closed pipe as often as an exit code
+            self.close()
+            return {'success': False, 'error': str(error) or f'Sandbox worker failed: {type(error).__name__}'}
+
+    def close(self) -> None:
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            self.pool._retire(worker)
+
+    def __enter__(self) -> 'SandboxSession':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_default_pool: Optional[SandboxPool] = None
+_default_pool_lock = threading.Lock()
+
+
+_default_pool_error: Optional[str] = None
+
+
+def get_default_pool() -> SandboxPool:
+    global _default_pool, _default_pool_error
+    with _default_pool_lock:
+        if _default_pool_error is not None:
+            # isolation the kernel refused once is refused again, do not restart workers every coding step
+            raise SandboxUnavailable(_default_pool_error)
+        if _default_pool is None:
+            try:
+                _default_pool = SandboxPool()
+            except SandboxUnavailable as error:
+                _default_pool_error = str(error)
+                raise
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+class CodeSandbox:
+    def __init__(self, context: Dict[str, Any], trackers: Dict, schema_gen, generator, max_attempts: int = 3, pool: Optional[SandboxPool] = None):
+        self.trackers = trackers
+        self.generator = generator
+        self.max_attempts = max_attempts
+        self.context = context
+        self.schema_gen = schema_gen
+        self.pool = pool
+
+    def generate_code(self, problem: str, previous_attempts: List[Dict[str, str]] = []) -> Dict:
+        prompt = get_prompt(problem, analyze_structure(self.context), previous_attempts)
+        result = self.generator.generate_object({
+            'model': TOOL_NAME,
+            'schema': self.schema_gen.get_code_generator_schema(),
+            'system': prompt['system'],
+            'prompt': prompt['user'],
+        })
+        self.trackers['actionTracker'].track_think(result['object']['think'])
+        return result['object']
+
+    def solve(self, problem: str) -> Dict:
+        pool = self.pool or get_default_pool()
+        # every attempt of this problem runs on one worker, which no other problem ever gets
+        with pool.session(self.context) as sandbox:
+            attempts: List[Dict[str, str]] = []
+
+            for i in range(self.max_attempts):
+                generation = self.generate_code(problem, attempts)
+                code = generation.get('code')
+                if not code:
+                    attempts.append({'code': '', 'error': generation.get('error', 'No code was generated')})
+                    continue
+
+                logger.debug('Coding attempt %d: %s', i + 1, truncate(code))
+                result = sandbox.run(code)
+                logger.info('Coding attempt %d success: %s', i + 1, result['success'])
+                logger.debug('Coding attempt %d result: %s', i + 1, truncate(result))
+
+                if result['success']:
+                    return {'solution': {'code': code, 'output': result['output']}, 'attempts': attempts}
+
+                logger.warning('Coding error: %s', truncate(result['error']))
+                # the next generation sees every failed attempt with its error
+                attempts.append({'code': code, 'error': result['error']})
+
+        raise SandboxError(f'Failed to generate working code after {self.max_attempts} attempts')
@@ -0,0 +1,36 @@
+import logging
+import os
+from typing import Dict
+
+from utils.http_session import get_session, raise_for_error
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = 'https://s.jina.ai/'
+TIMEOUT_SECONDS = 30
+
+
+def search(query: str, tracker=None) -> Dict:
+    if not query.strip():
+        raise ValueError('Query cannot be empty')
+
+    response = get_session().get(
+        os.environ.get('JINA_SEARCH_URL') or DEFAULT_URL,
+        params={'q': query},
+        headers={
+            'Accept': 'application/json',
+            'Authorization': f"Bearer {os.environ.get('JINA_API_KEY', '')}",
+            'X-Respond-With': 'no-content',
+        },
+        timeout=TIMEOUT_SECONDS,
+    )
+    raise_for_error(response)
+    data = response.json()
+    if not isinstance(data.get('data'), list):
+        raise Exception('Invalid response format')
+
+    total_tokens = sum((item.get('usage') or {}).get('tokens', 0) for item in data['data'])
+    logger.info('Total URLs: %d', len(data['data']))
+    if tracker:
+        tracker.track_usage('search', {'totalTokens': total_tokens, 'promptTokens': len(query), 'completionTokens': total_tokens})
+    return {'response': data}
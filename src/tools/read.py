@@ -0,0 +1,38 @@
+import logging
+import os
+from typing import Dict
+
+from utils.http_session import get_session, raise_for_error
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = 'https://r.jina.ai/'
+TIMEOUT_SECONDS = 30
+
+
+def read_url(url: str, tracker=None, with_all_links: bool = False) -> Dict:
+    if not url.strip():
+        raise ValueError('URL cannot be empty')
+
+    headers = {
+        'Accept': 'application/json',
+        'Authorization': f"Bearer {os.environ.get('JINA_API_KEY', '')}",
+        'Content-Type': 'application/json',
+        'X-Retain-Images': 'none',
+        'X-Md-Link-Style': 'discarded',
+        'X-Timeout': '20',
+    }
+    if with_all_links:
+        headers['X-With-Links-Summary'] = 'all'
+
+    response = get_session().post(os.environ.get('JINA_READER_URL') or DEFAULT_URL, json={'url': url}, headers=headers, timeout=TIMEOUT_SECONDS)
+    raise_for_error(response)
+    data = response.json()
+    if not data.get('data'):
+        raise Exception('Invalid response data')
+
+    tokens = (data['data'].get('usage') or {}).get('tokens', 0)
+    logger.info('Read: %s', {'title': data['data'].get('title'), 'url': data['data'].get('url'), 'tokens': tokens})
+    if tracker:
+        tracker.track_usage('read', {'totalTokens': tokens, 'promptTokens': len(url), 'completionTokens': tokens})
+    return {'response': data}
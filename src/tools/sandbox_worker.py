@@ -0,0 +1,265 @@
+"""Sandbox worker process, started and fed by tools.code_sandbox.SandboxPool.
+
+Reads length-prefixed messages on stdin and answers on the original stdout. The first
+message is the pickled data of the one caller the worker serves; every later one is a
+JSON request carrying generated code to run against it. The pool kills the worker when
+that caller is done, so nothing one caller's code leaves behind reaches another.
+
+Before it reads any message the worker isolates itself: its own mount, network, IPC and
+UTS namespaces, a read-only root holding only the interpreter and the system libraries,
+an unprivileged uid with no capabilities and no way to start processes. If any step
+fails it reports itself not ready and exits; generated code never runs without the
+isolation.
+"""
+import ctypes
+import io
+import json
+import os
+import pickle
+import platform
+import resource
+import struct
+import sys
+import traceback
+
+HEADER = struct.Struct('>I')
+MAX_MEMORY_BYTES = 1024 * 1024 * 1024
+MAX_FILE_BYTES = 1024 * 1024
+MAX_OPEN_FILES = 64
+MAX_OUTPUT_CHARS = 10_000
+TMP_SIZE = '16m'
+# uid and gid generated code runs as when the pool runs as root
+SANDBOX_UID = 65534
+SANDBOX_GID = 65534
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MNT_DETACH = 0x2
+PR_SET_NO_NEW_PRIVS = 38
+PR_CAPBSET_DROP = 24
+PR_SET_SECUREBITS = 28
+# root gains no capabilities on exec, ambient capabilities cannot be raised, both locked
+SECUREBITS = 0x1 | 0x2 | 0x40 | 0x80
+LINUX_CAPABILITY_VERSION_3 = 0x20080522
+SYS_PIVOT_ROOT = {'x86_64': 155, 'aarch64': 41}
+# read-only in the sandbox: the interpreter and the libraries it loads
+SYSTEM_PATHS = ('/usr', '/lib', '/lib64', '/lib32', '/bin')
+
+# Audit events generated code must never raise: no network, no new processes, no native code.
+# A second line behind the namespaces, not the isolation itself.
+BLOCKED_EVENTS = frozenset({
+    'socket.__new__', 'socket.connect', 'socket.bind', 'socket.getaddrinfo', 'socket.sendto',
+    'subprocess.Popen', 'os.system', 'os.exec', 'os.posix_spawn', 'os.spawn', 'os.fork', 'os.forkpty',
+    'os.kill', 'os.killpg', 'ctypes.dlopen', 'ctypes.dlsym', 'sys.addaudithook', 'sys.settrace', 'sys.setprofile',
+})
+BLOCKED_MODULES = frozenset({'_posixsubprocess', '_ctypes', 'ctypes'})
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [('version', ctypes.c_uint32), ('pid', ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [('effective', ctypes.c_uint32), ('permitted', ctypes.c_uint32), ('inheritable', ctypes.c_uint32)]
+
+
+def _check(result: int, what: str) -> None:
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f'{what}: {os.strerror(errno)}')
+
+
+def _write(path: str, text: str) -> None:
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def _mount(libc, source, target: str, fstype, flags: int, data=None) -> None:
+    encode = lambda value: value.encode() if value is not None else None  # noqa: E731
+    _check(libc.mount(encode(source), target.encode(), encode(fstype), flags, encode(data)), f'mount {target}')
+
+
+def _bind_readonly(libc, source: str, target: str) -> None:
+    os.makedirs(target, exist_ok=True)
+    _mount(libc, source, target, None, MS_BIND | MS_REC)
+    # flags the source is mounted with are locked in a user namespace, keep them
+    locked = os.statvfs(source).f_flag & (MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    _mount(libc, None, target, None, MS_REMOUNT | MS_BIND | MS_RDONLY | MS_NOSUID | MS_NODEV | locked)
+
+
+def _system_paths() -> list:
+    paths: list = []
+    for path in sorted({*SYSTEM_PATHS, os.path.realpath(sys.base_prefix), os.path.realpath(sys.prefix)}):
+        if os.path.lexists(path) and not any(path.startswith(p + '/') for p in paths):
+            paths.append(path)
+    return paths
+
+
+def _drop_privileges(libc, as_root: bool) -> None:
+    _check(libc.prctl(PR_SET_SECUREBITS, SECUREBITS, 0, 0, 0), 'prctl(PR_SET_SECUREBITS)')
+    cap = 0
+    while libc.prctl(PR_CAPBSET_DROP, cap, 0, 0, 0) == 0:
+        cap += 1
+    if as_root:
+        os.setgroups([])
+        os.setresgid(SANDBOX_GID, SANDBOX_GID, SANDBOX_GID)
+        os.setresuid(SANDBOX_UID, SANDBOX_UID, SANDBOX_UID)
+    # root of a user namespace keeps its capabilities there until they are cleared
+    _check(libc.capset(ctypes.byref(_CapHeader(LINUX_CAPABILITY_VERSION_3, 0)), (_CapData * 2)()), 'capset')
+    _check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), 'prctl(PR_SET_NO_NEW_PRIVS)')
+
+
+def isolate(workdir: str) -> None:
+    """Moves the worker onto a root of its own with nothing of the host in view, as an unprivileged user.
+
+    Run as root the worker switches to SANDBOX_UID; otherwise it makes a user namespace in
+    which the invoking user is root only to set up its mounts. Raises OSError when the
+    kernel refuses any step.
+    """
+    machine = platform.machine()
+    if machine not in SYS_PIVOT_ROOT:
+        raise OSError(f'pivot_root is not known on {machine}')
+    libc = ctypes.CDLL(None, use_errno=True)
+    as_root = os.geteuid() == 0
+    uid, gid = os.geteuid(), os.getegid()
+    flags = CLONE_NEWNS | CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS | (0 if as_root else CLONE_NEWUSER)
+    _check(libc.unshare(flags), 'unshare')
+    if not as_root:
+        _write('/proc/self/setgroups', 'deny')
+        _write('/proc/self/uid_map', f'0 {uid} 1')
+        _write('/proc/self/gid_map', f'0 {gid} 1')
+    # mounts from here on stay in this namespace
+    _mount(libc, None, '/', None, MS_REC | MS_PRIVATE)
+
+    root = os.path.join(workdir, 'root')
+    _mount(libc, 'tmpfs', root, 'tmpfs', MS_NOSUID | MS_NODEV, 'size=1m,mode=0755')
+    for path in _system_paths():
+        if os.path.islink(path) and os.path.dirname(path) == '/':
+            # /lib -> usr/lib and the like, the target is bound on its own
+            os.symlink(os.readlink(path), root + path)
+        elif os.path.isdir(path):
+            _bind_readonly(libc, path, root + path)
+    os.mkdir(root + '/tmp')
+    _mount(libc, 'tmpfs', root + '/tmp', 'tmpfs', MS_NOSUID | MS_NODEV | MS_NOEXEC, f'size={TMP_SIZE},mode=1777')
+
+    os.mkdir(root + '/.old')
+    _check(libc.syscall(SYS_PIVOT_ROOT[machine], root.encode(), (root + '/.old').encode()), 'pivot_root')
+    os.chdir('/')
+    _check(libc.umount2(b'/.old', MNT_DETACH), 'umount /.old')
+    os.rmdir('/.old')
+    _mount(libc, None, '/', None, MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+    _drop_privileges(libc, as_root)
+
+
+def apply_limits() -> None:
+    resource.setrlimit(resource.RLIMIT_AS, (MAX_MEMORY_BYTES, MAX_MEMORY_BYTES))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_FILE_BYTES, MAX_FILE_BYTES))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (MAX_OPEN_FILES, MAX_OPEN_FILES))
+    # no fork, no threads: the worker runs the code on its only thread
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def install_guard() -> None:
+    def guard(event, args):
+        if event in BLOCKED_EVENTS or (event == 'import' and args[0] in BLOCKED_MODULES):
+            raise PermissionError(f'{event} {args[0] if event == "import" else ""}'.strip() + ' is not allowed in the sandbox')
+
+    sys.addaudithook(guard)
+
+
+def limit_cpu(seconds: float) -> None:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    resource.setrlimit(resource.RLIMIT_CPU, (used + max(int(seconds), 1), hard))
+
+
+def read_frame(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    return stream.read(HEADER.unpack(header)[0])
+
+
+def read_message(stream):
+    frame = read_frame(stream)
+    return None if frame is None else json.loads(frame)
+
+
+def write_message(stream, message) -> None:
+    body = json.dumps(message, default=repr, ensure_ascii=False).encode('utf-8')
+    stream.write(HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+def run(code: str, variables: dict):
+    # generated code ends with a `return`, so it runs as the body of a function
+    body = '\n'.join('    ' + line for line in code.splitlines()) or '    pass'
+    source = f"def __solve__({', '.join(variables)}):\n{body}\n"
+    namespace: dict = {}
+    exec(compile(source, '<generated>', 'exec'), namespace)
+    return namespace['__solve__'](**variables)
+
+
+def main() -> None:
+    requests = sys.stdin.buffer
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    # anything generated code prints goes to a buffer, never into the protocol stream
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    try:
+        isolate(sys.argv[1])
+    except OSError as error:
+        write_message(responses, {'ready': False, 'error': f'Sandbox isolation unavailable: {error}'})
+        return
+    # generated code must import ctypes again to get at it, which the guard refuses
+    for name in [name for name in sys.modules if name.split('.')[0] in BLOCKED_MODULES]:
+        del sys.modules[name]
+    apply_limits()
+    install_guard()
+    write_message(responses, {'ready': True})
+
+    payload = read_frame(requests)
+    if payload is None:
+        return
+    try:
+        variables = pickle.loads(payload)
+    except Exception as error:
+        write_message(responses, {'loaded': False, 'error': f'Could not load the sandbox data: {type(error).__name__}: {error}'})
+        return
+    del payload
+    write_message(responses, {'loaded': True})
+
+    while True:
+        request = read_message(requests)
+        if request is None:
+            break
+        limit_cpu(request['timeout'])
+        sys.stdout = io.StringIO()
+        try:
+            output = run(request['code'], dict(variables))
+            if output is None:
+                response = {'success': False, 'error': 'No value was returned, make sure to use "return" statement to return the result'}
+            else:
+                response = {'success': True, 'output': output}
+        except BaseException as error:
+            frames = traceback.extract_tb(error.__traceback__)
+            line = next((f.lineno - 1 for f in reversed(frames) if f.filename == '<generated>'), None)
+            response = {'success': False, 'error': f'{type(error).__name__}: {error}' + (f' (line {line})' if line else '')}
+        response['stdout'] = sys.stdout.getvalue()[:MAX_OUTPUT_CHARS]
+        sys.stdout = sys.__stdout__
+        write_message(responses, response)
+
+
+if __name__ == '__main__':
+    main()
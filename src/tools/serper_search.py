@@ -0,0 +1,20 @@
+import os
+from typing import Dict
+
+from utils.http_session import get_session
+
+DEFAULT_URL = 'https://google.serper.dev/search'
+TIMEOUT_SECONDS = 10
+
+
+def serper_search(query: Dict) -> Dict:
+    response = get_session().post(
+        os.environ.get('SERPER_SEARCH_URL') or DEFAULT_URL,
+        json={**query, 'autocorrect': False},
+        headers={'X-API-KEY': os.environ.get('SERPER_API_KEY', ''), 'Content-Type': 'application/json'},
+        timeout=TIMEOUT_SECONDS,
+    )
+    if response.status_code != 200:
+        raise Exception(f'Serper search failed: {response.status_code} {response.reason}')
+    # Maintain the same return structure as the original code
+    return {'response': response.json()}
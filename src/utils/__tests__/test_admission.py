@@ -0,0 +1,57 @@
+import contextvars
+import threading
+import time
+
+from utils import admission
+
+
+def test_limit_holds_and_waiters_go_by_priority():
+    semaphore = admission.PrioritySemaphore(1)
+    semaphore.acquire()
+    order = []
+
+    def wait(name, priority):
+        semaphore.acquire(priority)
+        order.append(name)
+        semaphore.release()
+
+    threads = [threading.Thread(target=wait, args=(name, priority)) for name, priority in (('low', 0.1), ('high', 0.9), ('mid', 0.5))]
+    for thread in threads:
+        thread.start()
+        # queue them in this order
+        while semaphore.stats()['waiting'] < threads.index(thread) + 1:
+            time.sleep(0.001)
+    semaphore.release()
+    for thread in threads:
+        thread.join()
+    assert order == ['high', 'mid', 'low']
+    assert semaphore.stats()['inUse'] == 0
+
+
+def test_slot_is_a_no_op_outside_a_pool_and_bounded_inside():
+    assert admission.slot(admission.LLM) is admission.NO_SLOT
+    limits = admission.ResourceLimits({admission.LLM: 2})
+    token = admission.bind(limits)
+    try:
+        peak = []
+        lock = threading.Lock()
+        active = [0]
+
+        def call():
+            with admission.slot(admission.LLM):
+                with lock:
+                    active[0] += 1
+                    peak.append(active[0])
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(call,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        admission.unbind(token)
+    assert max(peak) == 2
+    assert limits.stats()[admission.LLM]['acquired'] == 6
@@ -0,0 +1,40 @@
+import json
+
+from utils.checkpoint import SessionCheckpoint
+
+
+def test_replays_appends_and_in_place_changes(tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    checkpoint = SessionCheckpoint(path)
+    knowledge = [{'question': 'q1', 'answer': 'a1'}]
+    urls = {'https://a': {'weight': 1}}
+    checkpoint.write_step(1, {'allKnowledge': knowledge, 'allURLs': urls}, {'step': 1})
+
+    knowledge.append({'question': 'q2', 'answer': 'a2'})
+    checkpoint.write_step(2, {'allKnowledge': knowledge, 'allURLs': urls}, {'step': 2})
+    with open(path) as f:
+        assert json.loads(f.readlines()[-1])['delta'] == {'allKnowledge': {'append': [{'question': 'q2', 'answer': 'a2'}]}}
+
+    # compaction rewrites an item in place, a re-weighted URL changes its value in place
+    knowledge[0]['answer'] = 'a1, merged'
+    urls['https://a']['weight'] = 2
+    checkpoint.write_step(3, {'allKnowledge': knowledge, 'allURLs': urls}, {'step': 3})
+
+    restored = SessionCheckpoint(path).load()
+    assert restored['totalStep'] == 3
+    assert restored['state'] == {'step': 3}
+    assert restored['allKnowledge'] == [{'question': 'q1', 'answer': 'a1, merged'}, {'question': 'q2', 'answer': 'a2'}]
+    assert restored['allURLs'] == {'https://a': {'weight': 2}}
+
+
+def test_drops_a_torn_last_line(tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    checkpoint = SessionCheckpoint(path)
+    checkpoint.write_step(1, {'visitedURLs': ['https://a']}, {})
+    with open(path, 'a') as f:
+        f.write('{"version": 1, "totalSt')
+    restored = SessionCheckpoint(path).load()
+    assert restored['visitedURLs'] == ['https://a']
+    resumed = SessionCheckpoint(path)
+    resumed.write_step(2, {'visitedURLs': ['https://a', 'https://b']}, {})
+    assert SessionCheckpoint(path).load()['visitedURLs'] == ['https://a', 'https://b']
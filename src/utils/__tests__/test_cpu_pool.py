@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from benchmarks import mock_server
+from utils import cpu_pool
+from utils.embedding_store import CachedEmbedder, EmbeddingStore
+from utils.passage_index import HashingEmbedder, PassageIndex
+
+
+@pytest.fixture
+def pool():
+    pool = cpu_pool.configure(2)
+    yield pool
+    cpu_pool.configure(0)
+
+
+def test_offloaded_pages_match_in_process(pool):
+    pages = [(f'https://example.com/{i}', mock_server.page(f'https://example.com/{i}', 20000)['content']) for i in range(4)]
+    offloaded = PassageIndex()
+    for url, text in pages:
+        offloaded.add_document(url, text)
+    assert pool.pages == 4
+    cpu_pool.configure(0)
+    local = PassageIndex()
+    for url, text in pages:
+        local.add_document(url, text)
+    assert offloaded.passages == local.passages
+    assert np.allclose(offloaded._vectors[:offloaded._size], local._vectors[:local._size])
+
+
+def test_cached_hashing_embedder_offloads_and_fills_the_cache(pool, tmp_path):
+    text = mock_server.page('https://example.com/cached', 20000)['content']
+    embedder = CachedEmbedder(HashingEmbedder(), EmbeddingStore(str(tmp_path), HashingEmbedder().dimensions))
+    index = PassageIndex(embedder)
+    index.add_document('https://example.com/cached', text)
+    assert pool.pages == 1
+    assert len(embedder.store) == len(index.passages)
@@ -0,0 +1,66 @@
+import threading
+
+import numpy as np
+
+from utils.embedding_store import EmbeddingStore, content_key
+
+DIMENSIONS = 8
+
+
+def vectors(start, count):
+    # small integers, exact in float16
+    return np.arange(start, start + count, dtype=np.float32)[:, None] + np.arange(DIMENSIONS, dtype=np.float32)
+
+
+def keys(start, count):
+    return [content_key(str(i)) for i in range(start, start + count)]
+
+
+def test_appends_are_seen_by_other_readers(tmp_path):
+    writer = EmbeddingStore(str(tmp_path), DIMENSIONS)
+    reader = EmbeddingStore(str(tmp_path), DIMENSIONS, read_only=True)
+    assert writer.put(keys(0, 3), vectors(0, 3)) == 3
+    assert writer.put(keys(2, 3), vectors(2, 3)) == 2
+    got = reader.get(keys(0, 6))
+    assert got[5] is None
+    assert np.array_equal(np.stack(got[:5]), vectors(0, 5))
+
+
+def test_append_after_a_torn_write(tmp_path):
+    store = EmbeddingStore(str(tmp_path), DIMENSIONS)
+    store.put(keys(0, 2), vectors(0, 2))
+    with open(store.path, 'ab') as f:
+        # a writer that died halfway through a record
+        f.write(b'\1' * (store.dtype.itemsize // 2))
+    assert len(EmbeddingStore(str(tmp_path), DIMENSIONS)) == 2
+    store.put(keys(2, 2), vectors(2, 2))
+    assert len(EmbeddingStore(str(tmp_path), DIMENSIONS)) == 4
+    assert np.array_equal(np.stack(EmbeddingStore(str(tmp_path), DIMENSIONS).get(keys(0, 4))), vectors(0, 4))
+
+
+def test_concurrent_put_and_get(tmp_path):
+    store = EmbeddingStore(str(tmp_path), DIMENSIONS)
+    errors = []
+    done = threading.Event()
+
+    def write():
+        for start in range(0, 400, 4):
+            store.put(keys(start, 4), vectors(start, 4))
+        done.set()
+
+    def read():
+        try:
+            while not done.is_set():
+                for i, vector in enumerate(store.get(keys(0, 400))):
+                    if vector is not None:
+                        assert np.array_equal(vector, vectors(i, 1)[0])
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(store) == 400
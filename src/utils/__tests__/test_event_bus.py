@@ -0,0 +1,54 @@
+import threading
+import time
+
+from utils.event_bus import EventBus
+
+
+def test_slow_listener_only_delays_itself():
+    bus = EventBus(queue_size=4)
+    fast, slow = [], []
+    release = threading.Event()
+    bus.subscribe('usage', fast.append, queue_size=1000)
+    bus.subscribe('usage', lambda event: (release.wait(5), slow.append(event)))
+    started = time.monotonic()
+    for i in range(100):
+        bus.publish('usage', i)
+    assert time.monotonic() - started < 1
+    deadline = time.monotonic() + 5
+    while len(fast) < 100 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert fast == list(range(100))
+    release.set()
+    assert bus.flush(5)
+    # the slow mailbox kept only the latest events it had room for
+    assert len(slow) <= 6 and slow[-1] == 99
+    bus.close()
+
+
+def test_think_updates_coalesce():
+    bus = EventBus()
+    seen = []
+    gate = threading.Event()
+    bus.subscribe('action', lambda event: (gate.wait(5), seen.append(event)))
+    bus.publish('action', 'first')
+    time.sleep(0.05)
+    for i in range(10):
+        bus.publish('action', f'think {i}', coalesce_key='think')
+    gate.set()
+    assert bus.flush(5)
+    assert seen == ['first', 'think 9']
+    bus.close()
+
+
+def test_close_delivers_what_was_published():
+    bus = EventBus()
+    seen = []
+    bus.subscribe('usage', seen.append)
+    for i in range(50):
+        bus.publish('usage', i)
+    bus.close()
+    bus.publish('usage', 'late')
+    deadline = time.monotonic() + 5
+    while len(seen) < 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert seen == list(range(50))
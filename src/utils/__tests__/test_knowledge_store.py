@@ -0,0 +1,68 @@
+import datetime
+import os
+import threading
+
+import numpy as np
+
+from utils.knowledge_store import KnowledgeStore
+
+
+def item(i, updated=None):
+    return {
+        'question': f'What is the boiling point of liquid number {i}?',
+        'answer': f'Liquid number {i} boils at {100 + i} degrees.',
+        'references': [f'https://example.com/{i}'],
+        'type': 'qa',
+        'updated': updated,
+    }
+
+
+def test_concurrent_adds_from_many_threads(tmp_path):
+    store = KnowledgeStore(str(tmp_path))
+    errors = []
+
+    def add(thread):
+        try:
+            for i in range(10):
+                store.add([item(thread * 100 + i)])
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=add, args=(t,)) for t in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.path.getsize(store.matrix_path) == 60 * store.dimensions * 4
+    found, score = store.search('boiling point of liquid number 305', k=1)[0]
+    assert found['answer'] == 'Liquid number 305 boils at 405 degrees.'
+    # the row the item points at holds its own vector
+    expected = store.embedder.embed([found['question'] + '\n' + found['answer']])[0]
+    assert np.isclose(score, float(expected @ store.embedder.embed(['boiling point of liquid number 305'], 'retrieval.query')[0]))
+    store.close()
+
+
+def test_append_after_a_torn_write(tmp_path):
+    store = KnowledgeStore(str(tmp_path))
+    store.add([item(1)])
+    with open(store.matrix_path, 'ab') as f:
+        # a writer that died halfway through a vector
+        f.write(b'\0' * (store.dimensions * 2 + 3))
+    store.add([item(2)])
+    assert os.path.getsize(store.matrix_path) == 2 * store.dimensions * 4
+    expected = store.embedder.embed([item(2)['question'] + '\n' + item(2)['answer']])[0]
+    found, score = store.search('boiling point of liquid number 2', k=1)[0]
+    assert found['question'] == item(2)['question']
+    assert np.isclose(score, float(expected @ store.embedder.embed([item(2)['question']], 'retrieval.query')[0]))
+    store.close()
+
+
+def test_freshness_follows_updated(tmp_path):
+    store = KnowledgeStore(str(tmp_path))
+    old = (datetime.datetime.now() - datetime.timedelta(days=90)).strftime('%Y-%m-%d %H:%M:%S')
+    store.add([item(1, updated=old), item(2, updated=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')), item(3)])
+    questions = {found['question'] for found, _ in store.search('boiling point of liquid number', k=5, max_age_days=30)}
+    assert questions == {item(2)['question'], item(3)['question']}
+    assert len(store.search('boiling point of liquid number', k=5, max_age_days=None)) == 3
+    store.close()
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from action_types import TokenTracker
+from utils.safe_generator import ObjectGeneratorSafe
+
+
+class FakeConfig:
+    def __init__(self, text):
+        self.model = SimpleNamespace(
+            name='fake-model',
+            backend=SimpleNamespace(provider='fake'),
+            generate=lambda *args: (text, {'promptTokens': 900, 'completionTokens': 100, 'totalTokens': 1000}),
+        )
+
+    def getModel(self, model_type):
+        return self.model
+
+    def getToolConfig(self, model_type):
+        return {'model': 'fake-model', 'maxTokens': 100, 'temperature': 0}
+
+
+def test_usage_counts_when_the_response_does_not_parse():
+    tracker = TokenTracker()
+    # cut off at the output limit halfway through the object
+    result = ObjectGeneratorSafe(tracker, FakeConfig('{"action": "answer", "think": "the answ')).generate_object(
+        {'model': 'agent', 'schema': {}, 'prompt': 'question'})
+    assert result['object']['action'] == 'error'
+    assert tracker.get_total_usage()['totalTokens'] == 1000
+    tracker.close()
+
+
+def test_usage_counts_once_when_the_response_parses():
+    tracker = TokenTracker()
+    result = ObjectGeneratorSafe(tracker, FakeConfig('{"action": "answer"}')).generate_object(
+        {'model': 'agent', 'schema': {}, 'prompt': 'question'})
+    assert result['object'] == {'action': 'answer', 'think': 'Reasoning not provided'}
+    assert tracker.get_total_usage()['totalTokens'] == 1000
+    tracker.close()
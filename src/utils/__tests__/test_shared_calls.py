@@ -0,0 +1,43 @@
+import threading
+import time
+
+import pytest
+
+from utils.shared_calls import SharedCalls
+
+
+def test_concurrent_callers_share_one_call():
+    shared = SharedCalls()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'result'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(shared.call('key', slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ['result'] * 5
+    assert shared.stats()['inFlight'] == 0
+
+
+def test_keeps_only_the_latest_results():
+    shared = SharedCalls(max_results=2)
+    for key in 'abc':
+        shared.call(key, lambda: key)
+    assert shared.stats()['keys'] == 2
+    assert shared.stats()['evicted'] == 1
+    assert shared.call('a', lambda: 'again') == 'again'
+    assert shared.call('c', lambda: 'again') == 'c'
+
+
+def test_failures_are_not_kept():
+    shared = SharedCalls()
+    with pytest.raises(ZeroDivisionError):
+        shared.call('key', lambda: 1 / 0)
+    assert shared.call('key', lambda: 'ok') == 'ok'
@@ -0,0 +1,11 @@
+from utils.token_counter import TokenCounter
+
+
+def test_count_knowledge_leaves_the_item_alone():
+    counter = TokenCounter()
+    item = {'question': 'What is the capital of France?', 'answer': 'Paris is the capital of France.', 'type': 'qa'}
+    before = counter.count_knowledge(item)
+    assert set(item) == {'question', 'answer', 'type'}
+    counter.calibrate(counter.count_raw('x' * 400), 200)
+    # the cached raw count follows the new calibration
+    assert counter.count_knowledge(dict(item)) > before
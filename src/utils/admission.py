@@ -0,0 +1,139 @@
+"""Concurrency limits on provider calls shared by every session of a research pool.
+
+A session run by ResearchPool carries the pool's ResourceLimits and a priority in its
+context, and each LLM call, search and page read takes a slot of its resource type for
+its duration. When slots run out, the highest priority waiter goes next: sessions
+closest to finishing free their memory and their tenant's place soonest. Outside a pool
+slot() is a shared no-op.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+LLM = 'llm'
+SEARCH = 'search'
+READ = 'read'
+
+
+class PrioritySemaphore:
+    """A counting semaphore that wakes waiters by priority, then arrival, instead of at random."""
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+        self.limit = limit
+        self.in_use = 0
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._waiters: List[Tuple[float, int, threading.Event]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: float = 0.0) -> float:
+        """Blocks until a slot is free, returning the seconds spent waiting."""
+        with self._lock:
+            if self.in_use < self.limit and not self._waiters:
+                self.in_use += 1
+                self.acquired += 1
+                return 0.0
+            ready = threading.Event()
+            heapq.heappush(self._waiters, (-priority, next(self._counter), ready))
+        start = time.monotonic()
+        ready.wait()
+        waited = time.monotonic() - start
+        with self._lock:
+            # release() handed its slot over, in_use already counts this caller
+            self.acquired += 1
+            self.waited += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                heapq.heappop(self._waiters)[2].set()
+            else:
+                self.in_use -= 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'inUse': self.in_use,
+                'waiting': len(self._waiters),
+                'acquired': self.acquired,
+                'waited': self.waited,
+                'waitSeconds': round(self.wait_seconds, 4),
+                'maxWaitSeconds': round(self.max_wait_seconds, 4),
+            }
+
+
+class _Slot:
+    __slots__ = ('semaphore', 'priority')
+
+    def __init__(self, semaphore: PrioritySemaphore, priority: Callable[[], float]):
+        self.semaphore = semaphore
+        self.priority = priority
+
+    def __enter__(self) -> '_Slot':
+        self.semaphore.acquire(self.priority())
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.semaphore.release()
+
+
+class _NoSlot:
+    def __enter__(self) -> '_NoSlot':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NO_SLOT = _NoSlot()
+
+
+class ResourceLimits:
+    """In-flight call limits per resource type; a resource without a limit is not bounded."""
+
+    def __init__(self, limits: Dict[str, int]):
+        self.semaphores: Dict[str, PrioritySemaphore] = {resource: PrioritySemaphore(limit) for resource, limit in limits.items() if limit}
+
+    def slot(self, resource: str, priority: Callable[[], float]):
+        semaphore = self.semaphores.get(resource)
+        return _Slot(semaphore, priority) if semaphore is not None else NO_SLOT
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {resource: semaphore.stats() for resource, semaphore in self.semaphores.items()}
+
+
+def _no_priority() -> float:
+    return 0.0
+
+
+# (limits, priority) of the session running in this context, set by ResearchPool
+_admission: contextvars.ContextVar = contextvars.ContextVar('deepresearch_admission', default=None)
+
+
+def bind(limits: ResourceLimits, priority: Optional[Callable[[], float]] = None) -> contextvars.Token:
+    """Makes calls from this context, and from pool threads it propagates to, take slots of `limits`."""
+    return _admission.set((limits, priority or _no_priority))
+
+
+def unbind(token: contextvars.Token) -> None:
+    _admission.reset(token)
+
+
+def slot(resource: str):
+    """A context manager holding one `resource` slot of the current session's pool, if any."""
+    admission = _admission.get()
+    if admission is None:
+        return NO_SLOT
+    return admission[0].slot(resource, admission[1])
@@ -0,0 +1,90 @@
+import json
+from typing import Dict, List, Optional
+
+from action_types import TokenTracker
+from utils.token_counter import TokenCounter, token_counter
+
+# Expected prompt growth from a single URL read landing in the knowledge.
+EST_TOKENS_PER_READ = 2000
+MAX_READS_PER_STEP = 4
+# Steps of headroom to keep before throttling to cheaper actions.
+THROTTLE_HEADROOM_STEPS = 2
+
+CONTINUE = 'continue'
+THROTTLE = 'throttle'
+BEAST = 'beast'
+
+
+class BudgetScheduler:
+    """Decides per step whether to continue, throttle to cheap actions or enter beast mode early."""
+
+    def __init__(self, token_tracker: TokenTracker, token_budget: int, max_completion_tokens: int, regular_ratio: float = 0.9, counter: TokenCounter = token_counter):
+        self.token_tracker = token_tracker
+        # calibrated on the model the steps go to
+        self.counter = counter
+        self.token_budget = token_budget
+        # reserve the rest of the budget for the beast mode
+        self.regular_budget = token_budget * regular_ratio
+        self.max_completion_tokens = max_completion_tokens
+        self._unmetered = 0
+        self._steps = 0
+        self._spent_in_steps = 0
+        self._step_start: Optional[int] = None
+        self._step_estimate = 0
+
+    def used(self) -> int:
+        return self.token_tracker.get_total_usage()['totalTokens'] + self._unmetered
+
+    def remaining(self) -> float:
+        return self.regular_budget - self.used()
+
+    def has_budget(self) -> bool:
+        return self.remaining() > 0
+
+    def estimate_step(self, system: str, schema: Dict, knowledge: List[Dict], messages: List[Dict]) -> int:
+        # knowledge counts are cached by the counter, only the small per-step parts are counted here
+        prompt_tokens = self.counter.count(system) + self.counter.count(json.dumps(schema))
+        prompt_tokens += sum(self.counter.count_knowledge(k) for k in knowledge)
+        prompt_tokens += self.counter.count_messages(messages)
+        estimate = prompt_tokens + self.max_completion_tokens
+        if self._steps:
+            # tool calls (dedup, rewrite, evaluation...) only show up in the observed spend
+            estimate = max(estimate, self._spent_in_steps // self._steps)
+        return estimate
+
+    def schedule(self, estimate: int, allow_read: bool) -> str:
+        remaining = self.remaining()
+        if remaining < estimate:
+            return BEAST
+        headroom = estimate * THROTTLE_HEADROOM_STEPS
+        if allow_read:
+            # every page read is replayed in all following prompts
+            headroom += MAX_READS_PER_STEP * EST_TOKENS_PER_READ
+        if remaining < headroom:
+            return THROTTLE
+        return CONTINUE
+
+    def begin_step(self, estimate: int) -> None:
+        self._step_start = self.token_tracker.get_total_usage()['totalTokens']
+        self._step_estimate = estimate
+
+    def end_step(self) -> None:
+        if self._step_start is None:
+            return
+        spent = self.token_tracker.get_total_usage()['totalTokens'] - self._step_start
+        if spent <= 0:
+            # the provider reported no usage, charge the estimate so the loop stays bounded
+            spent = self._step_estimate
+            self._unmetered += spent
+        self._steps += 1
+        self._spent_in_steps += spent
+        self._step_start = None
+
+    def get_summary(self) -> Dict[str, float]:
+        return {
+            'budget': self.token_budget,
+            'regularBudget': self.regular_budget,
+            'used': self.used(),
+            'unmetered': self._unmetered,
+            'steps': self._steps,
+        }
@@ -0,0 +1,115 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# Growing containers written as deltas; everything else is derived and rebuilt on resume.
+LIST_FIELDS = ['allContext', 'allKeywords', 'allQuestions', 'allKnowledge', 'visitedURLs', 'diaryContext']
+DICT_FIELDS = ['allURLs']
+
+CHECKPOINT_VERSION = 1
+
+
+class SessionCheckpoint:
+    """Append-only JSON lines log of research step deltas.
+
+    Each line carries only what changed since the previous line plus the small loop state,
+    so a step costs the size of its own additions rather than a dump of the whole session.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # list field -> (item, shallow copy of it) pairs as of the last write
+        self._lists: Dict[str, List[Tuple[Any, Any]]] = {}
+        # dict field -> key -> shallow copy of its value as of the last write
+        self._dicts: Dict[str, Dict[str, Any]] = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def write_step(self, total_step: int, data: Dict[str, Any], state: Dict[str, Any]) -> None:
+        delta: Dict[str, Any] = {}
+        for field in LIST_FIELDS:
+            if field in data:
+                change = self._list_delta(field, data[field])
+                if change:
+                    delta[field] = change
+        for field in DICT_FIELDS:
+            if field in data:
+                change = self._dict_delta(field, data[field])
+                if change:
+                    delta[field] = change
+
+        record = {'version': CHECKPOINT_VERSION, 'totalStep': total_step, 'delta': delta, 'state': state}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            # survive a preempted machine, not only a crashed process
+            os.fsync(f.fileno())
+
+    def _list_delta(self, field: str, items: List[Any]) -> Optional[Dict[str, Any]]:
+        prev = self._lists.get(field)
+        self._lists[field] = [(item, _snapshot(item)) for item in items]
+        if prev is None:
+            return {'set': list(items)} if items else None
+        # a replaced or mutated item anywhere, like compact_knowledge merging the middle, rewrites the field
+        if len(items) < len(prev) or any(items[i] is not item or items[i] != copy for i, (item, copy) in enumerate(prev)):
+            return {'set': list(items)}
+        return {'append': items[len(prev):]} if len(items) > len(prev) else None
+
+    def _dict_delta(self, field: str, items: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        prev = self._dicts.get(field, {})
+        # new keys and values changed in place, like a re-weighted URL
+        updated = {k: v for k, v in items.items() if k not in prev or v != prev[k]}
+        removed = [k for k in prev if k not in items]
+        self._dicts[field] = {k: _snapshot(v) for k, v in items.items()}
+        change: Dict[str, Any] = {}
+        if updated:
+            change['update'] = updated
+        if removed:
+            change['remove'] = removed
+        return change or None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Replays the log into {'totalStep', 'state', <fields>}, or None without a checkpoint."""
+        if not self.exists():
+            return None
+        restored: Dict[str, Any] = {field: [] for field in LIST_FIELDS}
+        restored.update({field: {} for field in DICT_FIELDS})
+        restored['totalStep'] = 0
+        restored['state'] = {}
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                good_offset += len(line)
+                for field, change in record['delta'].items():
+                    if field in DICT_FIELDS:
+                        restored[field].update(change.get('update', {}))
+                        for key in change.get('remove', []):
+                            restored[field].pop(key, None)
+                    elif 'set' in change:
+                        restored[field] = change['set']
+                    else:
+                        restored[field].extend(change['append'])
+                restored['totalStep'] = record['totalStep']
+                restored['state'] = record['state']
+        if good_offset < os.path.getsize(self.path):
+            # drop a torn last line from a crash mid-write so the next append starts on a clean line
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+        return restored
+
+
+def _snapshot(value: Any) -> Any:
+    # one level deep: a replaced value inside an item shows up, a nested list changed in place does not
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
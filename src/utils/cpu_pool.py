@@ -0,0 +1,163 @@
+"""Process pool for the CPU-bound part of reading a page: passage splitting and hashing embeddings.
+
+Sessions on different threads hand their pages to one pool per host. A dispatcher thread
+gathers the pages submitted within a few milliseconds into a single work item, copies
+their text into one shared memory block and sends the workers only its name and the
+byte offsets of each page; the workers send back passage offsets and vectors, never the
+text itself. Splitting and embedding then run on every core instead of taking turns on
+the GIL of the process running get_response.
+
+Off by default. DEEPRESEARCH_CPU_WORKERS sets the number of worker processes, "auto"
+for one per core, or call configure().
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CPU_WORKERS_ENV = 'DEEPRESEARCH_CPU_WORKERS'
+# pages shorter than this are split and embedded in-process, shipping them costs more than it saves
+MIN_OFFLOAD_CHARS = 8000
+MAX_BATCH_PAGES = 32
+MAX_BATCH_BYTES = 4 * 1024 * 1024
+# how long the dispatcher waits for more pages before it ships a batch
+MAX_BATCH_DELAY_SECONDS = 0.002
+
+
+def _split_and_embed_batch(block_name: str, pages: List[Tuple[int, int]], dimensions: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Worker side: (passage char spans, vectors) for each (offset, length) page in the block."""
+    from multiprocessing import shared_memory
+
+    from utils.passage_index import EMBED_BATCH_SIZE, HashingEmbedder, passage_spans
+
+    embedder = HashingEmbedder(dimensions)
+    # spawned workers share the parent's resource tracker, the parent's unlink() accounts for this too
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        results = []
+        for offset, length in pages:
+            text = bytes(block.buf[offset:offset + length]).decode('utf-8')
+            spans = passage_spans(text)
+            passages = [text[start:end] for start, end in spans]
+            vectors = np.concatenate([
+                embedder.embed(passages[i:i + EMBED_BATCH_SIZE], 'retrieval.passage')
+                for i in range(0, len(passages), EMBED_BATCH_SIZE)
+            ]) if passages else np.empty((0, dimensions), dtype=np.float32)
+            results.append((np.array(spans, dtype=np.int64).reshape(-1, 2), vectors))
+        return results
+    finally:
+        block.close()
+
+
+class CpuPool:
+    """Splits and embeds pages for every session of the process on `workers` processes."""
+
+    def __init__(self, workers: int):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # forked workers would inherit the locks of whatever threads the agent is running
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        self.workers = workers
+        self.batches = 0
+        self.pages = 0
+        self._queue: 'queue.Queue[Optional[Tuple[str, int, Future]]]' = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name='cpu-pool-dispatch', daemon=True)
+        self._dispatcher.start()
+
+    def split_and_embed(self, text: str, dimensions: int) -> Future:
+        """A Future of (passage char spans, vectors) for `text`, already whitespace-normalized."""
+        future: Future = Future()
+        self._queue.put((text, dimensions, future))
+        return future
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + MAX_BATCH_DELAY_SECONDS
+            while len(batch) < MAX_BATCH_PAGES and size < MAX_BATCH_BYTES:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+                size += len(item[0])
+            # one work item per embedding size, sessions rarely mix them
+            for dimensions in {d for _, d, _ in batch}:
+                self._submit([(text, future) for text, d, future in batch if d == dimensions], dimensions)
+
+    def _submit(self, batch: List[Tuple[str, Future]], dimensions: int) -> None:
+        from multiprocessing import shared_memory
+
+        encoded = [text.encode('utf-8') for text, _ in batch]
+        block = shared_memory.SharedMemory(create=True, size=max(1, sum(len(data) for data in encoded)))
+        pages = []
+        offset = 0
+        for data in encoded:
+            block.buf[offset:offset + len(data)] = data
+            pages.append((offset, len(data)))
+            offset += len(data)
+        self.batches += 1
+        self.pages += len(batch)
+
+        def done(work: Future) -> None:
+            block.close()
+            block.unlink()
+            error = work.exception()
+            for index, (_, future) in enumerate(batch):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(work.result()[index])
+
+        try:
+            self.executor.submit(_split_and_embed_batch, block.name, pages, dimensions).add_done_callback(done)
+        except Exception as error:
+            block.close()
+            block.unlink()
+            for _, future in batch:
+                future.set_exception(error)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._dispatcher.join()
+        self.executor.shutdown()
+
+
+_pool: Optional[CpuPool] = None
+_configured = False
+_pool_lock = threading.Lock()
+
+
+def configure(workers: Optional[int]) -> Optional[CpuPool]:
+    """Starts a pool of `workers` processes for this process's sessions; 0 or None turns it off."""
+    global _pool, _configured
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = CpuPool(workers) if workers else None
+        _configured = True
+    return _pool
+
+
+def get_pool() -> Optional[CpuPool]:
+    global _pool, _configured
+    if not _configured:
+        with _pool_lock:
+            if not _configured:
+                setting = os.environ.get(CPU_WORKERS_ENV, '').strip().lower()
+                workers = (os.cpu_count() or 1) if setting == 'auto' else int(setting or 0)
+                _pool = CpuPool(workers) if workers else None
+                _configured = True
+    return _pool
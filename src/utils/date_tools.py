@@ -0,0 +1,13 @@
+import datetime
+from typing import Dict
+
+
+def formatDateRange(query: Dict) -> str:
+    # Placeholder for date range formatting
+    return str(query.get('tbs'))
+
+def formatDateBasedOnType(date: datetime.datetime, format_type: str) -> str:
+    if format_type == "full":
+        return date.strftime("%Y-%m-%d %H:%M:%S")
+    # Add other format types as needed
+    return str(date)
@@ -0,0 +1,198 @@
+import fcntl
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+KEY_BYTES = 20
+
+
+def content_key(*parts: str) -> bytes:
+    return hashlib.sha1('\0'.join(parts).encode('utf-8')).digest()
+
+
+class EmbeddingStore:
+    """Append-only float16 embeddings keyed by content hash, in one memory-mapped file.
+
+    Each record is a sha1 key followed by its vector, so a reader never sees a key without
+    its vector and compaction swaps the whole file with a single rename. Writers serialize
+    on a lock file; readers on the same host map the file read-only and share its pages.
+    Threads of one process share the mapping and its key index under an in-process lock.
+    """
+
+    def __init__(self, directory: str, dimensions: int, read_only: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.dimensions = dimensions
+        self.read_only = read_only
+        self.path = os.path.join(directory, f'embeddings-{dimensions}.f16')
+        self.lock_path = self.path + '.lock'
+        self.dtype = np.dtype([('key', f'S{KEY_BYTES}'), ('vector', '<f2', (dimensions,))])
+        self._records: Optional[np.ndarray] = None
+        self._inode: Optional[int] = None
+        self._rows: Dict[bytes, int] = {}
+        # guards _records, _inode and _rows, which refresh() replaces and extends together
+        self._state_lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._state_lock:
+            self.refresh()
+            return len(self._rows)
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def refresh(self) -> None:
+        """Picks up records appended by other writers and files swapped in by a compaction.
+
+        A record still being written, or torn by a writer that died, is left out until whole.
+        """
+        with self._state_lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._records, self._inode, self._rows = None, None, {}
+                return
+            count = stat.st_size // self.dtype.itemsize
+            if stat.st_ino != self._inode:
+                self._records, self._inode, self._rows = None, stat.st_ino, {}
+            known = 0 if self._records is None else len(self._records)
+            if count <= known:
+                return
+            self._records = np.memmap(self.path, dtype=self.dtype, mode='r', shape=(count,))
+            # keep the first row of a key, a concurrent writer may have appended it twice
+            for row, key in enumerate(self._records['key'][known:].tolist(), start=known):
+                self._rows.setdefault(key, row)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Zero-copy (rows, dimensions) float16 view of every stored vector."""
+        with self._state_lock:
+            self.refresh()
+            if self._records is None:
+                return np.empty((0, self.dimensions), dtype=np.float16)
+            return self._records['vector']
+
+    def rows(self, keys: List[bytes]) -> List[Optional[int]]:
+        with self._state_lock:
+            self.refresh()
+            return [self._rows.get(key) for key in keys]
+
+    def get(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        # rows and the view they index come from the same refresh
+        with self._state_lock:
+            self.refresh()
+            if self._records is None:
+                return [None] * len(keys)
+            vectors = self._records['vector']
+            return [None if row is None else vectors[row] for row in map(self._rows.get, keys)]
+
+    def put(self, keys: List[bytes], vectors: np.ndarray) -> int:
+        if self.read_only:
+            raise PermissionError(f'Embedding store {self.path} is opened read-only')
+        records = np.empty(len(keys), dtype=self.dtype)
+        records['key'] = keys
+        records['vector'] = vectors
+        with self._locked(), self._state_lock:
+            self.refresh()
+            new = [i for i, key in enumerate(keys) if key not in self._rows]
+            if new:
+                with open(self.path, 'ab') as f:
+                    size = f.seek(0, os.SEEK_END)
+                    whole = size - size % self.dtype.itemsize
+                    if whole != size:
+                        # a writer died halfway through a record; appending after it would shift every later one
+                        f.truncate(whole)
+                    f.write(records[new].tobytes())
+            self.refresh()
+        return len(new)
+
+    def compact(self, keep: Optional[Iterable[bytes]] = None) -> int:
+        """Rewrites the file without duplicate keys and, when given, keys outside `keep`.
+
+        Readers holding the old mapping keep reading the old file until their next refresh.
+        Returns the number of records dropped.
+        """
+        if self.read_only:
+            raise PermissionError(f'Embedding store {self.path} is opened read-only')
+        with self._locked(), self._state_lock:
+            self.refresh()
+            if self._records is None:
+                return 0
+            keep = None if keep is None else set(keep)
+            rows = sorted(row for key, row in self._rows.items() if keep is None or key in keep)
+            dropped = len(self._records) - len(rows)
+            if not dropped:
+                return 0
+            tmp_path = self.path + '.compact'
+            with open(tmp_path, 'wb') as f:
+                f.write(np.ascontiguousarray(self._records[rows]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.refresh()
+        return dropped
+
+    def close(self) -> None:
+        """Drops the mapping and the key index; a later call maps the file again."""
+        with self._state_lock:
+            self._records, self._inode, self._rows = None, None, {}
+
+
+class CachedEmbedder:
+    """Wraps an embedder so every text is embedded at most once per store.
+
+    Late-chunked passages depend on the rest of their request, so their key also covers
+    the whole batch; they hit the cache when the same document is read again.
+    """
+
+    def __init__(self, embedder, store: EmbeddingStore):
+        self.embedder = embedder
+        self.store = store
+        self.dimensions = store.dimensions
+        self.hits = 0
+        self.misses = 0
+
+    def _late_chunked(self, task: str) -> bool:
+        return task == 'retrieval.passage' and getattr(self.embedder, 'late_chunking', False)
+
+    def _keys(self, texts: List[str], task: str) -> List[bytes]:
+        name = getattr(self.embedder, 'name', type(self.embedder).__name__)
+        if self._late_chunked(task):
+            batch = content_key(*texts).hex()
+            return [content_key(name, task, batch, text) for text in texts]
+        return [content_key(name, task, text) for text in texts]
+
+    def embed(self, texts: List[str], task: str = 'retrieval.passage') -> np.ndarray:
+        keys = self._keys(texts, task)
+        cached = self.store.get(keys)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing and self._late_chunked(task):
+            # a partial batch would give different vectors, embed the document as a whole
+            missing = list(range(len(texts)))
+        matrix = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        for i, vector in enumerate(cached):
+            if vector is not None:
+                matrix[i] = vector
+        if missing:
+            vectors = self.embedder.embed([texts[i] for i in missing], task)
+            matrix[missing] = vectors
+            if not self.store.read_only:
+                self.store.put([keys[i] for i in missing], vectors)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return matrix
+
+    def remember(self, texts: List[str], task: str, vectors: np.ndarray) -> None:
+        """Stores vectors of the wrapped embedder computed elsewhere, e.g. in the CPU pool."""
+        self.misses += len(texts)
+        if not self.store.read_only:
+            self.store.put(self._keys(texts, task), vectors)
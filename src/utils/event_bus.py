@@ -0,0 +1,187 @@
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (payload, coalesce_key)
+QueuedEvent = Tuple[Any, Optional[str]]
+
+
+class Subscriber:
+    """Bounded mailbox drained by its own worker thread, so a slow listener only delays itself."""
+
+    def __init__(self, event_name: str, listener: Callable, queue_size: int):
+        self.event_name = event_name
+        self.listener = listener
+        self.queue_size = queue_size
+        self._queue: Deque[QueuedEvent] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._busy = False
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.max_queued = 0
+        self._worker = threading.Thread(target=self._run, name=f'event-bus-{event_name}', daemon=True)
+        self._worker.start()
+
+    def offer(self, payload: Any, coalesce_key: Optional[str]) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            if coalesce_key is not None and self._queue and self._queue[-1][1] == coalesce_key:
+                # only the latest update matters, e.g. the agent's current think
+                self._queue[-1] = (payload, coalesce_key)
+                self.coalesced += 1
+                return
+            if len(self._queue) >= self.queue_size:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append((payload, coalesce_key))
+            self.max_queued = max(self.max_queued, len(self._queue))
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                payload, _ = self._queue.popleft()
+                self._busy = True
+            try:
+                self.listener(payload)
+                self.delivered += 1
+            except Exception:
+                self.failed += 1
+                logger.exception('Event listener for "%s" failed', self.event_name)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'event': self.event_name,
+            'queued': len(self._queue),
+            'maxQueued': self.max_queued,
+            'queueSize': self.queue_size,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'failed': self.failed,
+        }
+
+
+class EventBus:
+    """Non-blocking fan-out of tracker events.
+
+    publish() only appends to a bounded pending queue; a dispatcher thread fans events out
+    to the per-subscriber mailboxes, so the agent loop pays O(1) however many clients listen.
+    """
+
+    def __init__(self, max_pending: int = 1024, queue_size: int = 256):
+        self.max_pending = max_pending
+        self.queue_size = queue_size
+        self._pending: Deque[Tuple[str, Any, Optional[str]]] = deque()
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self._cond = threading.Condition()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._dispatching = False
+        self._closed = False
+        self.published = 0
+        self.dropped_pending = 0
+
+    def subscribe(self, event_name: str, listener: Callable, queue_size: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(event_name, listener, queue_size or self.queue_size)
+        with self._cond:
+            if self._closed:
+                subscriber.close()
+                return subscriber
+            # copy on write, the dispatcher iterates the list without holding the lock
+            self._subscribers[event_name] = [*self._subscribers.get(event_name, []), subscriber]
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='event-bus-dispatcher', daemon=True)
+                self._dispatcher.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._cond:
+            self._subscribers[subscriber.event_name] = [
+                s for s in self._subscribers.get(subscriber.event_name, []) if s is not subscriber
+            ]
+        subscriber.close()
+
+    def has_subscribers(self, event_name: str) -> bool:
+        return bool(self._subscribers.get(event_name))
+
+    def publish(self, event_name: str, payload: Any, coalesce_key: Optional[str] = None) -> None:
+        if not self._subscribers.get(event_name):
+            return
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.dropped_pending += 1
+            self._pending.append((event_name, payload, coalesce_key))
+            self.published += 1
+            self._cond.notify_all()
+
+    def _dispatch(self) -> None:
+        while True:
+            with self._cond:
+                self._dispatching = False
+                self._cond.notify_all()
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                event_name, payload, coalesce_key = self._pending.popleft()
+                subscribers = self._subscribers.get(event_name, [])
+                self._dispatching = True
+            for subscriber in subscribers:
+                subscriber.offer(payload, coalesce_key)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until every published event reached its listeners, for shutdown and tests."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._pending and not self._dispatching, timeout):
+                return False
+            subscribers = [s for subs in self._subscribers.values() for s in subs]
+        return all(s.flush(timeout) for s in subscribers)
+
+    def close(self) -> None:
+        """Stops taking events and lets every thread of the bus exit once what was published is delivered."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            dispatcher = self._dispatcher
+        # the dispatcher hands out the pending events before it exits, it never blocks on a listener
+        if dispatcher is not None and dispatcher is not threading.current_thread():
+            dispatcher.join()
+        with self._cond:
+            subscribers = [s for subs in self._subscribers.values() for s in subs]
+            self._subscribers = {}
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            'pending': len(self._pending),
+            'maxPending': self.max_pending,
+            'published': self.published,
+            'droppedPending': self.dropped_pending,
+            'subscribers': [s.get_metrics() for subs in self._subscribers.values() for s in subs],
+        }
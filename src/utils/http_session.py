@@ -0,0 +1,41 @@
+import threading
+
+# Concurrent requests to one host that keep a pooled connection; more wait for a free one.
+POOL_SIZE = 32
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The requests session search and read calls share, created on first use.
+
+    Every session and thread reuses its keep-alive connections, so a step's searches
+    skip the TCP and TLS handshake after the first one.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def raise_for_error(response) -> None:
+    """Raises with the provider's readable message when it sent one, like the TS tools do."""
+    if response.status_code < 400:
+        return
+    try:
+        message = response.json().get('readableMessage')
+    except ValueError:
+        message = None
+    if response.status_code == 402:
+        raise Exception(message or 'Insufficient balance')
+    raise Exception(message or f'HTTP Error {response.status_code}')
@@ -0,0 +1,163 @@
+import math
+import re
+from typing import Dict, FrozenSet, List, Optional
+
+from utils.token_counter import TokenCounter, token_counter
+
+SIDE_INFO_QUESTION = re.compile(r'^What do Internet say about "(.*)"\?$', re.S)
+WORD = re.compile(r'\w+', re.U)
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?。！？])\s+|;\s+|\n+')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from how in is it of on or that the this to was what when where which who why with'.split()
+)
+
+# Query word sets at least this similar belong to the same query family.
+FAMILY_SIMILARITY = 0.6
+# Snippet word sets at least this similar are near-duplicates.
+SNIPPET_SIMILARITY = 0.8
+# Below this many tokens a trimmed item says nothing useful, evict it instead.
+MIN_TRIMMED_TOKENS = 64
+# Answers and coding results are never evicted, they are the agent's own progress.
+PROTECTED_TYPES = ('qa', 'coding')
+
+
+def terms(text: str) -> FrozenSet[str]:
+    return frozenset(w for w in WORD.findall(text.lower()) if w not in STOPWORDS and len(w) > 1)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def knowledge_tokens(item: Dict, counter: TokenCounter = token_counter) -> int:
+    return counter.count_knowledge(item)
+
+
+def side_info_query(item: Dict) -> Optional[str]:
+    if item.get('type') != 'side-info':
+        return None
+    match = SIDE_INFO_QUESTION.match(item['question'].strip())
+    return match.group(1) if match else None
+
+
+def dedup_snippets(snippets: List[str], seen: Optional[List[FrozenSet[str]]] = None) -> List[str]:
+    """Keeps the first of every group of near-duplicate snippets; `seen` is extended in place."""
+    seen = [] if seen is None else seen
+    kept: List[str] = []
+    for snippet in snippets:
+        words = terms(snippet)
+        if not words or any(jaccard(words, other) >= SNIPPET_SIMILARITY for other in seen):
+            continue
+        seen.append(words)
+        kept.append(snippet)
+    return kept
+
+
+def compact_knowledge(knowledge: List[Dict]) -> bool:
+    """Merges side-info items of the same query family and drops their near-duplicate snippets.
+
+    Works in place and returns whether anything changed; other knowledge types are untouched.
+    """
+    families: List[Dict] = []
+    compacted: List[Dict] = []
+    changed = False
+    for item in knowledge:
+        query = side_info_query(item)
+        if query is None:
+            compacted.append(item)
+            continue
+        query_terms = terms(re.sub(r'\bsite:\S+', '', query))
+        family = next((f for f in families if jaccard(f['terms'], query_terms) >= FAMILY_SIMILARITY), None)
+        snippets = [s for s in item['answer'].split('; ') if s.strip()]
+        if family is None:
+            family = {'terms': query_terms, 'queries': [query], 'seen': [], 'item': dict(item)}
+            kept = dedup_snippets(snippets, family['seen'])
+            changed = changed or len(kept) != len(snippets)
+            family['snippets'] = kept
+            families.append(family)
+            compacted.append(family['item'])
+            continue
+        changed = True
+        family['queries'].append(query)
+        family['snippets'].extend(dedup_snippets(snippets, family['seen']))
+        if item.get('updated'):
+            family['item']['updated'] = item['updated']
+
+    if not changed:
+        return False
+    for family in families:
+        queries = ', '.join(f'"{q}"' for q in family['queries'])
+        family['item']['question'] = f'What do Internet say about {queries}?' if len(family['queries']) > 1 else family['item']['question']
+        family['item']['answer'] = '; '.join(family['snippets'])
+    knowledge[:] = compacted
+    return True
+
+
+def _idf(knowledge: List[Dict], question_terms: FrozenSet[str]) -> Dict[str, float]:
+    doc_terms = [terms(k['question'] + ' ' + k['answer']) for k in knowledge]
+    n = len(doc_terms)
+    return {t: math.log(1 + (n + 1) / (1 + sum(t in d for d in doc_terms))) for t in question_terms}
+
+
+def relevance(text: str, question_terms: FrozenSet[str], idf: Dict[str, float]) -> float:
+    words = terms(text)
+    return sum(idf[t] for t in question_terms if t in words)
+
+
+def trim_to_tokens(item: Dict, question_terms: FrozenSet[str], idf: Dict[str, float], max_tokens: int, counter: TokenCounter = token_counter) -> Optional[Dict]:
+    """Extractive summary: keeps the most relevant sentences of the answer, in their original order."""
+    budget = max_tokens - counter.count(item['question'])
+    if budget < MIN_TRIMMED_TOKENS:
+        return None
+    sentences = [s for s in SENTENCE_SPLIT.split(item['answer']) if s.strip()]
+    ranked = sorted(range(len(sentences)), key=lambda i: relevance(sentences[i], question_terms, idf), reverse=True)
+    chosen: List[int] = []
+    used = 0
+    for i in ranked:
+        cost = counter.count(sentences[i]) + 1
+        if used + cost > budget:
+            continue
+        chosen.append(i)
+        used += cost
+    if used < MIN_TRIMMED_TOKENS:
+        return None
+    return {**item, 'answer': ' '.join(sentences[i] for i in sorted(chosen))}
+
+
+def select_knowledge(knowledge: List[Dict], question: str, max_tokens: int, counter: TokenCounter = token_counter) -> List[Dict]:
+    """Picks the knowledge replayed into the prompt so it stays under max_tokens.
+
+    Protected items always stay. The rest are ranked by relevance to `question`, then kept
+    whole, trimmed to their most relevant sentences, or evicted, in that order of preference.
+    """
+    sizes = [knowledge_tokens(k, counter) for k in knowledge]
+    if sum(sizes) <= max_tokens:
+        return knowledge
+
+    selected: Dict[int, Dict] = {}
+    remaining = max_tokens
+    for i, k in enumerate(knowledge):
+        if k.get('type') in PROTECTED_TYPES:
+            selected[i] = k
+            remaining -= sizes[i]
+
+    question_terms = terms(question)
+    candidates = [i for i in range(len(knowledge)) if i not in selected]
+    idf = _idf([knowledge[i] for i in candidates], question_terms)
+    # newer items break ties, they were gathered with a better picture of the gaps
+    candidates.sort(key=lambda i: (relevance(knowledge[i]['question'] + ' ' + knowledge[i]['answer'], question_terms, idf), i), reverse=True)
+    for i in candidates:
+        if remaining <= 0:
+            break
+        if sizes[i] <= remaining:
+            selected[i] = knowledge[i]
+            remaining -= sizes[i]
+            continue
+        trimmed = trim_to_tokens(knowledge[i], question_terms, idf, remaining, counter)
+        if trimmed:
+            selected[i] = trimmed
+            remaining -= knowledge_tokens(trimmed, counter)
+
+    return [selected[i] for i in sorted(selected)]
@@ -0,0 +1,176 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.knowledge_compactor import terms
+from utils.passage_index import HashingEmbedder
+
+# Only knowledge backed by sources is worth sharing across sessions.
+SHAREABLE_TYPES = ('qa', 'url')
+FTS_CANDIDATES = 50
+# A stored qa item this similar to the question is an answer, not just background.
+SUFFICIENT_SIMILARITY = 0.8
+
+
+class KnowledgeStore:
+    """Persistent knowledge shared across sessions: SQLite FTS5 for recall, a memory-mapped matrix for ranking.
+
+    Rows of the float32 embedding file line up with the `row` column; both are only
+    appended under SQLite's write lock, so several workers can share one directory. Each
+    thread gets its own connection, so the sessions of a ResearchPool can share a store.
+    """
+
+    def __init__(self, directory: str, embedder=None):
+        os.makedirs(directory, exist_ok=True)
+        self.embedder = embedder or HashingEmbedder()
+        self.db_path = os.path.join(directory, 'knowledge.db')
+        self.matrix_path = os.path.join(directory, 'embeddings.f32')
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                hash TEXT UNIQUE,
+                question TEXT,
+                answer TEXT,
+                type TEXT,
+                refs TEXT,
+                updated TEXT,
+                created REAL,
+                row INTEGER
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(question, answer, content='items', content_rowid='id');
+        """)
+        if 'updated_at' not in {column[1] for column in self._conn.execute('PRAGMA table_info(items)')}:
+            # stores written before freshness followed `updated` date by the time items were added
+            self._conn.execute('ALTER TABLE items ADD COLUMN updated_at REAL')
+            self._conn.execute('UPDATE items SET updated_at = created')
+        self.dimensions = self._init_dimensions()
+        self._matrix: Optional[np.ndarray] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._lock:
+                if self._closed:
+                    raise sqlite3.ProgrammingError('Knowledge store is closed')
+                # only this thread uses it; close() may close it from another
+                conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+                self._connections.append(conn)
+        return conn
+
+    def _init_dimensions(self) -> int:
+        dimensions = self.embedder.embed(['dimensions probe']).shape[1]
+        found = self._conn.execute("SELECT value FROM meta WHERE key = 'dimensions'").fetchone()
+        if found is None:
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('dimensions', ?)", (str(dimensions),))
+        elif int(found[0]) != dimensions:
+            raise ValueError(f'Knowledge store at {self.db_path} holds {found[0]}-d embeddings, embedder gives {dimensions}-d')
+        return dimensions
+
+    def _rows(self) -> np.ndarray:
+        row_bytes = self.dimensions * 4
+        count = os.path.getsize(self.matrix_path) // row_bytes if os.path.exists(self.matrix_path) else 0
+        matrix = self._matrix
+        if matrix is None or len(matrix) < count:
+            # remap only when another writer grew the file, the mapping itself is zero-copy
+            matrix = self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r', shape=(count, self.dimensions)) if count else np.empty((0, self.dimensions), dtype=np.float32)
+        return matrix
+
+    def add(self, items: List[Dict]) -> int:
+        shareable = [k for k in items if k.get('type') in SHAREABLE_TYPES and k.get('references')]
+        if not shareable:
+            return 0
+        vectors = self.embedder.embed([k['question'] + '\n' + k['answer'] for k in shareable]).astype(np.float32)
+        added = 0
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row_bytes = self.dimensions * 4
+            with open(self.matrix_path, 'ab') as f:
+                size = f.seek(0, os.SEEK_END)
+                row = size // row_bytes
+                if size != row * row_bytes:
+                    # a writer died halfway through a vector; appending after it would shift every later row
+                    f.truncate(row * row_bytes)
+                for item, vector in zip(shareable, vectors):
+                    digest = hashlib.sha1((item['question'] + '\0' + item['answer']).encode('utf-8')).hexdigest()
+                    created = time.time()
+                    cursor = conn.execute(
+                        'INSERT OR IGNORE INTO items (hash, question, answer, type, refs, updated, created, row, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (digest, item['question'], item['answer'], item['type'], json.dumps(item['references'], default=str), item.get('updated'), created, row,
+                         _timestamp(item.get('updated'), created)),
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    conn.execute('INSERT INTO items_fts (rowid, question, answer) VALUES (?, ?, ?)', (cursor.lastrowid, item['question'], item['answer']))
+                    f.write(vector.tobytes())
+                    row += 1
+                    added += 1
+                # the rows are on disk before the items pointing at them are
+                f.flush()
+                os.fsync(f.fileno())
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return added
+
+    def search(self, question: str, k: int = 5, max_age_days: Optional[float] = 30) -> List[Tuple[Dict, float]]:
+        """Fresh items relevant to the question as (knowledge item, cosine similarity), best first."""
+        question_terms = terms(question)
+        if not question_terms:
+            return []
+        match = ' OR '.join(f'"{t}"' for t in question_terms)
+        min_updated = time.time() - max_age_days * 86400 if max_age_days is not None else 0
+        candidates = self._conn.execute(
+            """SELECT items.question, items.answer, items.type, items.refs, items.updated, items.row
+               FROM items_fts JOIN items ON items.id = items_fts.rowid
+               WHERE items_fts MATCH ? AND items.updated_at >= ?
+               ORDER BY bm25(items_fts) LIMIT ?""",
+            (match, min_updated, FTS_CANDIDATES),
+        ).fetchall()
+        matrix = self._rows()
+        candidates = [c for c in candidates if c[5] < len(matrix)]
+        if not candidates:
+            return []
+        query_vector = self.embedder.embed([question], 'retrieval.query')[0]
+        scores = matrix[[c[5] for c in candidates]] @ query_vector
+        ranked = sorted(zip(candidates, scores), key=lambda x: -x[1])[:k]
+        return [
+            ({'question': q, 'answer': a, 'type': t, 'references': json.loads(refs), 'updated': updated}, float(score))
+            for (q, a, t, refs, updated, _), score in ranked
+        ]
+
+    def is_sufficient(self, matches: List[Tuple[Dict, float]]) -> bool:
+        return any(item['type'] == 'qa' and score >= SUFFICIENT_SIMILARITY for item, score in matches)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        self._matrix = None
+        for conn in connections:
+            conn.close()
+
+
+def _timestamp(updated: Optional[str], default: float) -> float:
+    """Epoch seconds of an item's `updated` date, `default` when it has none or it does not parse."""
+    if not updated:
+        return default
+    try:
+        return datetime.datetime.fromisoformat(str(updated).strip()).timestamp()
+    except ValueError:
+        return default
@@ -0,0 +1,214 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from action_types import LanguageModelUsage
+
+# Concurrent requests one backend keeps connections open for; evaluator metrics and
+# concurrent sessions share them.
+POOL_SIZE = 16
+REQUEST_TIMEOUT_SECONDS = 60
+OPENAI_DEFAULT_BASE_URL = 'https://api.openai.com/v1'
+
+
+class LLMBackend:
+    """One provider account: its credentials and its connection pool, shared by every model it serves."""
+
+    provider = ''
+
+    def generate(self, model: str, prompt: Optional[str], system: Optional[str], schema: Optional[Dict], max_tokens: int, temperature: float, messages: Optional[List[Dict]] = None) -> Tuple[str, LanguageModelUsage]:
+        """Returns the JSON text of a structured-output completion and its token usage.
+
+        `messages` is the conversation so far, {"role", "content"} dicts as in generateObject;
+        `prompt`, when given too, follows it as the last user turn.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class LanguageModel:
+    """A model name bound to the backend that serves it, what Config.getModel returns."""
+
+    def __init__(self, backend: LLMBackend, name: str):
+        self.backend = backend
+        self.name = name
+
+    def generate(self, prompt: Optional[str], system: Optional[str], schema: Optional[Dict], max_tokens: int, temperature: float, messages: Optional[List[Dict]] = None) -> Tuple[str, LanguageModelUsage]:
+        return self.backend.generate(self.name, prompt, system, schema, max_tokens, temperature, messages)
+
+    def __repr__(self) -> str:
+        return f'LanguageModel({self.backend.provider}:{self.name})'
+
+
+def chat_messages(prompt: Optional[str], messages: Optional[List[Dict]]) -> List[Dict[str, str]]:
+    """`messages` then `prompt` as role/content turns; content given as parts keeps its text parts."""
+    turns = []
+    for message in messages or []:
+        content = message.get('content')
+        if isinstance(content, list):
+            content = '\n'.join(part.get('text', '') for part in content if part.get('type') == 'text')
+        turns.append({'role': message.get('role', 'user'), 'content': content or ''})
+    if prompt:
+        turns.append({'role': 'user', 'content': prompt})
+    return turns
+
+
+def usage_from_metadata(usage_metadata: Any) -> LanguageModelUsage:
+    prompt_tokens = getattr(usage_metadata, "prompt_token_count", None) or 0
+    completion_tokens = getattr(usage_metadata, "candidates_token_count", None) or 0
+    total_tokens = getattr(usage_metadata, "total_token_count", None) or prompt_tokens + completion_tokens
+    return {
+        "promptTokens": prompt_tokens,
+        "completionTokens": completion_tokens,
+        "totalTokens": total_tokens,
+    }
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini API, or Vertex AI with `vertexai=True`, through google-genai.
+
+    The SDK takes longer to import than the rest of the agent together, so it is imported
+    when the first request goes out.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, vertexai: bool = False, project: Optional[str] = None, location: Optional[str] = None, base_url: Optional[str] = None):
+        self.provider = 'vertex' if vertexai else 'gemini'
+        self.api_key = api_key
+        self.base_url = base_url
+        self.vertexai = vertexai
+        self.project = project
+        self.location = location
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    from google.genai import types
+
+                    http_options = types.HttpOptions(base_url=self.base_url) if self.base_url else None
+                    if self.vertexai:
+                        self._client = genai.Client(vertexai=True, project=self.project, location=self.location, http_options=http_options)
+                    else:
+                        self._client = genai.Client(api_key=self.api_key or "", http_options=http_options)
+        return self._client
+
+    def generate(self, model, prompt, system, schema, max_tokens, temperature, messages=None):
+        from google.genai import types
+
+        contents: Any = prompt
+        if messages:
+            turns = chat_messages(prompt, messages)
+            # Gemini takes system text only as the instruction, and calls the assistant "model"
+            system = '\n\n'.join([system or '', *(t['content'] for t in turns if t['role'] == 'system')]).strip() or None
+            contents = [{'role': 'model' if t['role'] == 'assistant' else 'user', 'parts': [{'text': t['content']}]} for t in turns if t['role'] != 'system']
+        response = self.client.models.generate_content(
+            model=model,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                max_output_tokens=max_tokens,
+                temperature=temperature,
+                response_mime_type='application/json',
+                response_schema=schema,
+                system_instruction=system
+            )
+        )
+        return response.text, usage_from_metadata(response.usage_metadata)
+
+
+class OpenAIBackend(LLMBackend):
+    """Any OpenAI-compatible chat completions endpoint, with JSON-schema structured output."""
+
+    provider = 'openai'
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, strict: bool = False, proxies: Optional[Dict[str, str]] = None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = (base_url or OPENAI_DEFAULT_BASE_URL).rstrip('/') + '/chat/completions'
+        self.strict = strict
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Bearer {api_key}'
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+        if proxies:
+            self.session.proxies.update(proxies)
+
+    def generate(self, model, prompt, system, schema, max_tokens, temperature, messages=None):
+        turns = ([{'role': 'system', 'content': system}] if system else []) + chat_messages(prompt, messages)
+        body: Dict[str, Any] = {'model': model, 'messages': turns, 'max_tokens': max_tokens, 'temperature': temperature}
+        if schema:
+            body['response_format'] = {'type': 'json_schema', 'json_schema': {'name': 'response', 'schema': schema, 'strict': self.strict}}
+        else:
+            body['response_format'] = {'type': 'json_object'}
+        response = self.session.post(self.url, json=body, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        data = response.json()
+        usage = data.get('usage') or {}
+        prompt_tokens = usage.get('prompt_tokens') or 0
+        completion_tokens = usage.get('completion_tokens') or 0
+        return data['choices'][0]['message']['content'], {
+            'promptTokens': prompt_tokens,
+            'completionTokens': completion_tokens,
+            'totalTokens': usage.get('total_tokens') or prompt_tokens + completion_tokens,
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _gemini_backend(config) -> LLMBackend:
+    return GeminiBackend(api_key=config.GEMINI_API_KEY, base_url=config.GEMINI_BASE_URL)
+
+
+def _vertex_backend(config) -> LLMBackend:
+    client_config = config.config_json['providers'].get('vertex', {}).get('clientConfig', {})
+    return GeminiBackend(vertexai=True, project=client_config.get('project') or config.GCLOUD_PROJECT, location=client_config.get('location') or config.GCLOUD_LOCATION)
+
+
+def _openai_backend(config) -> LLMBackend:
+    client_config = config.config_json['providers'].get('openai', {}).get('clientConfig', {})
+    return OpenAIBackend(config.OPENAI_API_KEY, config.OPENAI_BASE_URL, client_config.get('compatibility') == 'strict', config.proxies)
+
+
+# provider name -> factory taking a Config; register_backend adds more
+BACKENDS: Dict[str, Callable[[Any], LLMBackend]] = {
+    'gemini': _gemini_backend,
+    'vertex': _vertex_backend,
+    'openai': _openai_backend,
+}
+
+_backends: Dict[Tuple, LLMBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def register_backend(provider: str, factory: Callable[[Any], LLMBackend]) -> None:
+    BACKENDS[provider] = factory
+
+
+def get_backend(config) -> LLMBackend:
+    """The backend for the configured provider, created once per set of credentials.
+
+    A config reload that keeps the credentials keeps the backend and its open connections.
+    """
+    key = (config.LLM_PROVIDER, config.GEMINI_API_KEY, config.GEMINI_BASE_URL, config.OPENAI_API_KEY, config.OPENAI_BASE_URL, config.GCLOUD_PROJECT, config.GCLOUD_LOCATION)
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                if config.LLM_PROVIDER not in BACKENDS:
+                    raise ValueError(f'No backend registered for LLM provider: {config.LLM_PROVIDER}')
+                backend = _backends[key] = BACKENDS[config.LLM_PROVIDER](config)
+    return backend
+
+
+def close_backends() -> None:
+    with _backends_lock:
+        for backend in _backends.values():
+            backend.close()
+        _backends.clear()
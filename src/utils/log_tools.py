@@ -0,0 +1,49 @@
+"""Logging helpers: lazily rendered, size-capped payloads and the CLI's handler setup.
+
+Modules log through `logging.getLogger(__name__)` with %-style arguments, so nothing is
+formatted for a record below the configured level. Large payloads (schemas, steps,
+evaluations) go through truncate(), which also defers their serialization.
+"""
+import json
+import logging
+import os
+import sys
+from typing import Any, Optional, TextIO
+
+LOG_LEVEL_ENV = 'DEEPRESEARCH_LOG_LEVEL'
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+# characters a payload is cut to, enough to recognise it without flooding the log
+MAX_PAYLOAD_CHARS = 2000
+
+
+class _Truncated:
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        if isinstance(self.value, str):
+            text = self.value
+        else:
+            try:
+                text = json.dumps(self.value, ensure_ascii=False, default=str)
+            except (TypeError, ValueError):
+                text = repr(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f'{text[:self.limit]}... [{len(text) - self.limit} more chars]'
+
+    __repr__ = __str__
+
+
+def truncate(value: Any, limit: int = MAX_PAYLOAD_CHARS) -> _Truncated:
+    """A log argument rendered as JSON and cut to `limit` characters, only if the record is emitted."""
+    return _Truncated(value, limit)
+
+
+def configure_logging(level: Optional[str] = None, stream: Optional[TextIO] = None) -> None:
+    """Sends records at `level`, $DEEPRESEARCH_LOG_LEVEL or INFO to `stream` (stderr); for entry points, not libraries."""
+    level = (level or os.environ.get(LOG_LEVEL_ENV) or 'INFO').upper()
+    logging.basicConfig(level=level, format=LOG_FORMAT, stream=stream or sys.stderr, force=True)
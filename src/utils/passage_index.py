@@ -0,0 +1,196 @@
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils import cpu_pool
+from utils.knowledge_compactor import STOPWORDS, WORD
+
+# Passage windows over the extracted page text, overlapping so no sentence is only ever cut.
+PASSAGE_CHARS = 1200
+PASSAGE_OVERLAP = 200
+EMBED_BATCH_SIZE = 64
+HASHING_DIMENSIONS = 1024
+
+JINA_EMBEDDINGS_URL = 'https://api.jina.ai/v1/embeddings'
+
+
+def normalize_whitespace(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def passage_spans(text: str, size: int = PASSAGE_CHARS, overlap: int = PASSAGE_OVERLAP) -> List[Tuple[int, int]]:
+    """(start, end) of each passage window over already whitespace-normalized `text`."""
+    if len(text) <= size:
+        return [(0, len(text))] if text else []
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            # end on a word boundary when there is one in the last fifth of the window
+            space = text.rfind(' ', start + size * 4 // 5, end)
+            end = space if space > 0 else end
+        # normalized text has single spaces, at most one to trim on each side
+        spans.append((start + (text[start] == ' '), end - (text[end - 1] == ' ')))
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def split_passages(text: str, size: int = PASSAGE_CHARS, overlap: int = PASSAGE_OVERLAP) -> List[str]:
+    text = normalize_whitespace(text)
+    return [text[start:end] for start, end in passage_spans(text, size, overlap)]
+
+
+class HashingEmbedder:
+    """Local, dependency-free embedder: signed feature hashing of the passage words.
+
+    Deterministic across processes (crc32, not hash()), so its vectors can be persisted.
+    """
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f'hashing-{dimensions}'
+
+    def embed(self, texts: List[str], task: str = 'retrieval.passage') -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        rows: List[int] = []
+        cols: List[int] = []
+        signs: List[float] = []
+        for row, text in enumerate(texts):
+            for word in WORD.findall(text.lower()):
+                if word in STOPWORDS:
+                    continue
+                h = zlib.crc32(word.encode('utf-8'))
+                rows.append(row)
+                cols.append(h % self.dimensions)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        if rows:
+            np.add.at(matrix, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+        # sublinear term frequency, otherwise boilerplate repeated across a page drowns the rare terms
+        return normalize(np.sign(matrix) * np.log1p(np.abs(matrix)))
+
+
+class JinaEmbedder:
+    """jina-embeddings-v3 over HTTP; passages of one document go in one request for late chunking."""
+
+    name = 'jina-embeddings-v3'
+    late_chunking = True
+
+    def __init__(self, api_key: str, token_tracker=None, dimensions: int = 1024):
+        self.api_key = api_key
+        self.token_tracker = token_tracker
+        self.dimensions = dimensions
+        import requests  # only sessions that embed over HTTP pay for importing it
+
+        self.session = requests.Session()
+
+    def embed(self, texts: List[str], task: str = 'retrieval.passage') -> np.ndarray:
+        response = self.session.post(
+            os.environ.get('JINA_EMBEDDINGS_URL') or JINA_EMBEDDINGS_URL,
+            json={
+                'model': 'jina-embeddings-v3',
+                'task': task,
+                'late_chunking': self.late_chunking and task == 'retrieval.passage',
+                'dimensions': self.dimensions,
+                'embedding_type': 'float',
+                'input': texts,
+                'truncate': True,
+            },
+            headers={'Authorization': f'Bearer {self.api_key}'},
+            timeout=30,
+        )
+        response.raise_for_status()
+        data = response.json()
+        tokens = data.get('usage', {}).get('total_tokens', 0)
+        if self.token_tracker and tokens:
+            self.token_tracker.track_usage('latechunk', {'promptTokens': tokens, 'completionTokens': 0, 'totalTokens': tokens})
+        return normalize(np.array([item['embedding'] for item in data['data']], dtype=np.float32))
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class PassageIndex:
+    """In-session vector index over the passages of every page read so far.
+
+    Vectors live in one preallocated float32 matrix grown by doubling, so retrieval is a
+    single matrix-vector product regardless of how many pages were read.
+    """
+
+    def __init__(self, embedder=None, batch_size: int = EMBED_BATCH_SIZE):
+        self.embedder = embedder or HashingEmbedder()
+        self.batch_size = batch_size
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self.passages: List[str] = []
+        self.urls: List[str] = []
+        self._url_ranges: Dict[str, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def has_document(self, url: str) -> bool:
+        return url in self._url_ranges
+
+    def add_document(self, url: str, text: str) -> int:
+        if url in self._url_ranges:
+            return 0
+        text = normalize_whitespace(text)
+        # only the local embedder runs in the CPU pool, remote embedders are waiting on I/O anyway;
+        # a CachedEmbedder around it still offloads, and keeps the vectors the pool sends back
+        base = getattr(self.embedder, 'embedder', self.embedder)
+        pool = cpu_pool.get_pool() if type(base) is HashingEmbedder and len(text) >= cpu_pool.MIN_OFFLOAD_CHARS else None
+        if pool is not None:
+            spans, vectors = pool.split_and_embed(text, base.dimensions).result()
+            passages = [text[start:end] for start, end in spans.tolist()]
+            if base is not self.embedder and passages:
+                self.embedder.remember(passages, 'retrieval.passage', vectors)
+        else:
+            passages = [text[start:end] for start, end in passage_spans(text)]
+            vectors = None
+        if not passages:
+            return 0
+        if vectors is None:
+            vectors = np.concatenate([
+                self.embedder.embed(passages[i:i + self.batch_size], 'retrieval.passage')
+                for i in range(0, len(passages), self.batch_size)
+            ])
+        self._append(vectors)
+        start = len(self.passages)
+        self.passages.extend(passages)
+        self.urls.extend([url] * len(passages))
+        self._url_ranges[url] = (start, start + len(passages))
+        return len(passages)
+
+    def _append(self, vectors: np.ndarray) -> None:
+        needed = self._size + len(vectors)
+        if self._vectors is None:
+            self._vectors = np.empty((max(needed, 64), vectors.shape[1]), dtype=np.float32)
+        elif needed > len(self._vectors):
+            grown = np.empty((max(needed, len(self._vectors) * 2), vectors.shape[1]), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size:needed] = vectors
+        self._size = needed
+
+    def search(self, queries: List[str], k: int, url: Optional[str] = None) -> List[Tuple[str, str, float]]:
+        """Top k (url, passage, score); a passage scores its best similarity over all queries."""
+        if not self._size or not queries:
+            return []
+        start, end = self._url_ranges.get(url, (0, 0)) if url else (0, self._size)
+        if start == end:
+            return []
+        query_vectors = self.embedder.embed(queries, 'retrieval.query')
+        scores = (self._vectors[start:end] @ query_vectors.T).max(axis=1)
+        k = min(k, end - start)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.urls[start + i], self.passages[start + i], float(scores[i])) for i in top]
@@ -0,0 +1,121 @@
+import json
+import logging
+import math
+from typing import Dict, Optional
+
+from config import Config, get_config
+from utils import admission, tracing
+from utils.log_tools import truncate
+from utils.llm_backends import chat_messages
+from utils.token_counter import TokenCounter, fit_max_tokens, get_counter
+
+logger = logging.getLogger(__name__)
+
+# error of the object returned instead of sending a prompt the model cannot take
+PROMPT_TOO_LONG = "prompt too long"
+# error of the object returned when the caller gave up before the request went out
+CANCELLED = "cancelled"
+
+
+class ObjectGeneratorSafe:
+    def __init__(self, token_tracker, config: Optional[Config] = None):
+        self.token_tracker = token_tracker
+        # models, temperatures and token limits per tool come from config.json
+        self.config = config or get_config(validate=False)
+
+    def get_tool_config(self, model_type: str) -> Dict:
+        return self.config.getToolConfig(model_type)
+
+    def get_max_tokens(self, model_type: str) -> int:
+        return self.config.getMaxTokens(model_type)
+
+    def get_token_counter(self, model_type: str) -> TokenCounter:
+        return get_counter(self.get_tool_config(model_type)["model"])
+
+    def generate_object(self, generation_data: Dict) -> Dict:
+        """Generates an object with the model config.json routes `model` to."""
+        model_type = generation_data.get("model")
+        schema = generation_data.get("schema")
+        prompt = generation_data.get("prompt")
+        system = generation_data.get("system")
+        messages = generation_data.get("messages")
+        # a threading.Event the caller sets once it no longer needs the result
+        cancelled = generation_data.get("cancelled")
+
+        llm = self.config.getModel(model_type)
+        model = llm.name
+
+        config = self.get_tool_config(model_type)
+
+        max_tokens = config["maxTokens"]
+        temperature = config["temperature"]
+
+        # calibrated per model, tokenizers differ in how many characters make a token
+        counter = get_counter(model)
+        parts = [system or "", json.dumps(schema or {}), *(turn["content"] for turn in chat_messages(prompt, messages))]
+        raw_prompt_tokens = sum(counter.count_raw(part) for part in parts)
+        fitted_max_tokens = fit_max_tokens(model, math.ceil(raw_prompt_tokens * counter.scale), max_tokens)
+        if fitted_max_tokens is None:
+            logger.warning("Prompt for %s exceeds the context window of %s, request not sent", model_type, model)
+            return {"object": {"action": "error", "error": PROMPT_TOO_LONG, "think": "Prompt too long"}, "usage": {}}
+        max_tokens = fitted_max_tokens
+
+        # TODO: probably not these
+        functions = generation_data.get("functions")
+        function_call = generation_data.get("function_call", "auto")
+
+        # if not messages:
+        #     messages = []
+        # if system:
+        #     messages.insert(0, {"role": "system", "content": system})
+        # if prompt:
+        #     messages.append({"role": "user", "content": prompt})
+
+        try:
+            if functions:
+                # response = self.client.chat.completions.create(
+                #     model="gemini-2.0-flash",
+                #     messages=messages,
+                #     functions=functions,
+                #     function_call=function_call,
+                #     max_tokens=max_tokens,
+                #     temperature=temperature,
+                #     response_format=schema
+                # )
+                logger.debug("functions: %s", truncate(functions))
+            else:
+
+                # response = self.client.chat.completions.create(
+                #     model="gemini-2.0-flash",
+                #     messages=messages,
+                #     max_tokens=max_tokens,
+                #     temperature=temperature,
+                #     response_format=schema
+                # )
+                logger.debug("schema is %s", truncate(schema))
+                with admission.slot(admission.LLM), tracing.span("llm.generate", tool=model_type, provider=llm.backend.provider, model=model) as span:
+                    if cancelled is not None and cancelled.is_set():
+                        span.set_attribute("cancelled", True)
+                        return {"object": {"action": "error", "error": CANCELLED, "think": "Cancelled"}, "usage": {}}
+                    content_text, usage = llm.generate(prompt, system, schema, max_tokens, temperature, messages)
+                    span.set_attribute("prompt_tokens", usage["promptTokens"])
+                    span.set_attribute("completion_tokens", usage["completionTokens"])
+                # billed whether or not the text parses, a response cut off at max_tokens costs the most
+                self.token_tracker.track_usage(model_type, usage)
+                counter.calibrate(raw_prompt_tokens, usage["promptTokens"])
+
+            # Extract the JSON string from the response
+            try:
+                generated_object = json.loads(content_text)
+
+                if "think" not in generated_object:
+                    generated_object["think"] = "Reasoning not provided"
+                return {"object": generated_object, "usage": usage}
+
+            except (json.JSONDecodeError, IndexError, AttributeError) as e:
+                logger.error("Error parsing response: %s", e)
+                return {"object": {"action": "error", "error": str(e), "think": "Error parsing response"}, "usage": usage}
+
+        except Exception as e:
+            logger.error("%s API Error: %s", llm.backend.provider, e)
+            return {"object": {"action": "error", "error": str(e), "think": "Error occurred"}, "usage": {}}
@@ -1,3 +1,7 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 MAX_URLS_PER_STEP = 4
 MAX_QUERIES_PER_STEP = 5
 MAX_REFLECT_PER_STEP = 2
@@ -68,7 +72,7 @@ class Schemas:
         
         self.language_code = result["object"]["langCode"]
         self.language_style = result["object"]["langStyle"]
-        print("language", result["object"])
+        logger.debug("language %s", result["object"])
 
     def _simulate_generate_object(self, system_prompt, user_prompt):
         # This is a placeholder; you'd replace this with your actual logic to
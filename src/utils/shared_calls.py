@@ -0,0 +1,86 @@
+"""Search and read results shared by every session of a batch.
+
+Questions of one batch often search the same sub-queries and read the same pages. A
+session bound to a SharedCalls (research_batch does it) makes the provider call for a key
+only if no other session made or is making it; concurrent callers of the same key wait
+for the first one. Failures are not kept, the next caller tries again. Only the last
+`max_results` completed results are kept, the least recently used go first, so a long
+batch does not hold every page it ever read. Outside a batch call() just calls.
+"""
+import contextvars
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+# completed results kept for later callers; calls in flight are always shared
+DEFAULT_MAX_RESULTS = 256
+
+
+class SharedCalls:
+    def __init__(self, max_results: int = DEFAULT_MAX_RESULTS):
+        self.max_results = max_results
+        # key -> Future of a call in flight, and key -> completed Future, least recently used first
+        self._pending: Dict[Hashable, Future] = {}
+        self._results: 'OrderedDict[Hashable, Future]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+        self.evicted = 0
+
+    def call(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._results.get(key)
+            if future is not None:
+                self._results.move_to_end(key)
+            else:
+                future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not owner:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(error)
+            raise
+        # waiters hold the Future already, the entry is only kept for later callers
+        future.set_result(result)
+        with self._lock:
+            del self._pending[key]
+            if self.max_results > 0:
+                self._results[key] = future
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+                    self.evicted += 1
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared, 'evicted': self.evicted,
+                    'inFlight': len(self._pending), 'keys': len(self._results)}
+
+
+_shared: contextvars.ContextVar = contextvars.ContextVar('deepresearch_shared_calls', default=None)
+
+
+def bind(shared: SharedCalls) -> contextvars.Token:
+    return _shared.set(shared)
+
+
+def unbind(token: contextvars.Token) -> None:
+    _shared.reset(token)
+
+
+def call(key: Hashable, fn: Callable[[], Any]) -> Any:
+    """fn(), or the result another session of the batch already got for `key`."""
+    shared = _shared.get()
+    if shared is None:
+        return fn()
+    return shared.call(key, fn)
@@ -0,0 +1,49 @@
+import math
+from collections import Counter
+from typing import FrozenSet, List, Optional
+
+from utils.knowledge_compactor import STOPWORDS, WORD, dedup_snippets, terms
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in WORD.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+def bm25_scores(query: str, docs: List[str]) -> List[float]:
+    """Okapi BM25 of every doc against the query, with idf taken from the docs themselves."""
+    query_terms = set(tokenize(query))
+    doc_tokens = [tokenize(d) for d in docs]
+    if not query_terms or not doc_tokens:
+        return [0.0] * len(docs)
+    n = len(doc_tokens)
+    avg_len = sum(len(t) for t in doc_tokens) / n or 1.0
+    df = Counter(term for tokens in doc_tokens for term in set(tokens) if term in query_terms)
+    idf = {term: math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5)) for term in query_terms}
+
+    scores: List[float] = []
+    for tokens in doc_tokens:
+        tf = Counter(t for t in tokens if t in query_terms)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / avg_len)
+        scores.append(sum(idf[t] * f * (BM25_K1 + 1) / (f + norm) for t, f in tf.items()))
+    return scores
+
+
+def filter_snippets(query: str, snippets: List[str], top_n: int, seen: Optional[List[FrozenSet[str]]] = None) -> List[str]:
+    """Keeps the top_n snippets for the query, in search order, minus near-duplicates of `seen`.
+
+    `seen` is shared across the queries of a step so one snippet returned by several queries
+    only reaches the prompt once.
+    """
+    # dedup against a copy, snippets cut by top_n must not block other queries
+    snippets = dedup_snippets([s for s in snippets if s and s.strip()], list(seen or []))
+    if len(snippets) > top_n:
+        scores = bm25_scores(query, snippets)
+        # stable on ties, the search engine's own ranking is the better tie breaker
+        top = sorted(range(len(snippets)), key=lambda i: -scores[i])[:top_n]
+        snippets = [snippets[i] for i in sorted(top)]
+    if seen is not None:
+        seen.extend(terms(s) for s in snippets)
+    return snippets
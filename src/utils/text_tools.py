@@ -0,0 +1,14 @@
+import re
+from typing import List
+
+HTML_TAG = re.compile('<.*?>')
+
+
+def remove_extra_line_breaks(text: str) -> str:
+    return '\n'.join(line for line in text.splitlines() if line.strip())
+
+def removeHTMLtags(text: str) -> str:
+    return HTML_TAG.sub('', text)
+
+def chooseK(queries: List[str], k: int) -> List[str]:
+    return queries[:k]
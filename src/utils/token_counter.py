@@ -0,0 +1,100 @@
+import math
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+CJK = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+# Uncalibrated ratios, close to what BPE tokenizers do on web text.
+ASCII_CHARS_PER_TOKEN = 4.0
+CJK_TOKENS_PER_CHAR = 1.0
+OTHER_CHARS_PER_TOKEN = 2.0
+# Role markers and the <answer-datetime>/<url> wrappers around every knowledge message.
+KNOWLEDGE_MSG_OVERHEAD = 16
+# knowledge items whose raw count a counter remembers; past it the cache starts over
+RAW_CACHE_ITEMS = 4096
+
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    'gemini-2.0-flash': 1_048_576,
+    'gemini-2.0-flash-lite': 1_048_576,
+    'gpt-4o-mini': 128_000,
+    'gpt-4o': 128_000,
+}
+DEFAULT_CONTEXT_WINDOW = 128_000
+
+
+class TokenCounter:
+    """Local token estimator calibrated against the prompt tokens the provider reports.
+
+    Counts are produced without a tokenizer: a character-class heuristic gives raw units and
+    an exponential moving average of actual/raw ratios scales them to the provider's tokens.
+    """
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.scale = 1.0
+        self.samples = 0
+        # (question, answer) -> raw units, kept here so the items themselves stay untouched
+        self._raw: Dict[Tuple[str, str], float] = {}
+
+    def count_raw(self, text: str) -> float:
+        if not text:
+            return 0.0
+        ascii_chars = len(text.encode('ascii', 'ignore'))
+        cjk_chars = len(CJK.findall(text)) if ascii_chars < len(text) else 0
+        other_chars = len(text) - ascii_chars - cjk_chars
+        return ascii_chars / ASCII_CHARS_PER_TOKEN + cjk_chars * CJK_TOKENS_PER_CHAR + other_chars / OTHER_CHARS_PER_TOKEN
+
+    def count(self, text: str) -> int:
+        return math.ceil(self.count_raw(text) * self.scale)
+
+    def calibrate(self, raw_estimate: float, actual_tokens: int) -> None:
+        if raw_estimate <= 0 or actual_tokens <= 0:
+            return
+        ratio = actual_tokens / raw_estimate
+        self.scale = ratio if not self.samples else (1 - self.smoothing) * self.scale + self.smoothing * ratio
+        self.samples += 1
+
+    def count_knowledge(self, item: Dict) -> int:
+        """Cached by content as raw units, so recalibration never requires a recount."""
+        key = (item['question'], item['answer'])
+        raw = self._raw.get(key)
+        if raw is None:
+            raw = self.count_raw(item['question']) + self.count_raw(item['answer'])
+            if len(self._raw) >= RAW_CACHE_ITEMS:
+                self._raw.clear()
+            self._raw[key] = raw
+        return math.ceil(raw * self.scale) + KNOWLEDGE_MSG_OVERHEAD
+
+    def count_messages(self, messages: List[Dict]) -> int:
+        return sum(self.count(m['content']) for m in messages if isinstance(m.get('content'), str))
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def fit_max_tokens(model: str, prompt_tokens: int, max_tokens: int) -> Optional[int]:
+    """Clamps the completion budget to what the context window leaves; None when the prompt alone overflows."""
+    available = context_window(model) - prompt_tokens
+    if available <= 0:
+        return None
+    return min(max_tokens, available)
+
+
+# For callers that do not know the model; it stays at the uncalibrated ratios.
+token_counter = TokenCounter()
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_counter(model: Optional[str]) -> TokenCounter:
+    """The counter calibrated on `model`'s prompts, shared across sessions so it only gets better."""
+    if not model:
+        return token_counter
+    counter = _counters.get(model)
+    if counter is None:
+        with _counters_lock:
+            counter = _counters.setdefault(model, TokenCounter())
+    return counter
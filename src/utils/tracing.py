@@ -0,0 +1,358 @@
+"""Spans for research steps, LLM calls, searches, reads, evaluations and prompt/schema builds.
+
+Sampling is decided once per trace, at its root span: an unsampled trace costs one
+context-variable lookup per span. Sampled traces are handed whole to the exporters when
+their root ends, as OTLP/JSON lines an OpenTelemetry collector can ingest. Span duration
+metrics, when enabled, cover every span and are served in the Prometheus text format.
+
+Configured from the environment on first use, or with configure():
+
+    DEEPRESEARCH_TRACE_SAMPLE_RATE  share of traces to keep, 0 (default) to 1
+    DEEPRESEARCH_TRACE_FILE         OTLP/JSON lines file sampled traces are appended to
+    DEEPRESEARCH_METRICS_PORT       serve span metrics on http://127.0.0.1:PORT/metrics
+    DEEPRESEARCH_METRICS_HOST       address to serve them on instead, 0.0.0.0 for every interface
+"""
+import bisect
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE_ENV = 'DEEPRESEARCH_TRACE_SAMPLE_RATE'
+TRACE_FILE_ENV = 'DEEPRESEARCH_TRACE_FILE'
+METRICS_PORT_ENV = 'DEEPRESEARCH_METRICS_PORT'
+METRICS_HOST_ENV = 'DEEPRESEARCH_METRICS_HOST'
+DEFAULT_METRICS_HOST = '127.0.0.1'
+SERVICE_NAME = 'node-deepresearch-py'
+# attribute values are cut to this many characters, a question or URL is enough to find the span
+MAX_ATTRIBUTE_CHARS = 256
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# OTLP span status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current: contextvars.ContextVar = contextvars.ContextVar('deepresearch_span', default=None)
+
+
+class _NoopSpan:
+    sampled = False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledRoot(_NoopSpan):
+    """Marks a trace that was not sampled, so its children do not roll again."""
+
+    def __init__(self):
+        self._token = _current.set(self)
+
+    def end(self) -> None:
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+
+    def __exit__(self, *exc) -> None:
+        self.end()
+
+
+class Span:
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'sampled', 'start_ns', 'end_ns', 'status', 'message', '_token')
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Optional['Span'], sampled: bool, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else random.getrandbits(128)
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.sampled = sampled
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.message = ''
+        self.end_ns: Optional[int] = None
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.message = f'{type(error).__name__}: {error}'[:MAX_ATTRIBUTE_CHARS]
+
+    def end(self) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self.tracer._finish(self)
+
+    def __enter__(self) -> 'Span':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.record_error(exc)
+        self.end()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            'traceId': f'{self.trace_id:032x}',
+            'spanId': f'{self.span_id:016x}',
+            'name': self.name,
+            'kind': 1,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in self.attributes.items()],
+            'status': {'code': self.status, **({'message': self.message} if self.message else {})},
+        }
+        if self.parent_id is not None:
+            span['parentSpanId'] = f'{self.parent_id:016x}'
+        return span
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)[:MAX_ATTRIBUTE_CHARS]}
+
+
+def otlp_trace(spans: Sequence[Span]) -> Dict[str, Any]:
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{'scope': {'name': 'deepresearch'}, 'spans': [s.to_otlp() for s in spans]}],
+        }]
+    }
+
+
+class OTLPFileExporter:
+    """Appends each sampled trace as one OTLP/JSON line, the format of the collector's otlpjsonfile receiver."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        line = json.dumps(otlp_trace(spans), separators=(',', ':'))
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+class InMemoryExporter:
+    """Keeps the last `limit` traces, for tests and benchmarks."""
+
+    def __init__(self, limit: int = 100):
+        self.limit = limit
+        self.traces: List[List[Span]] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        with self._lock:
+            self.traces.append(list(spans))
+            del self.traces[:-self.limit]
+
+
+class SpanMetrics:
+    """Span duration histograms and error counts by span name, in Prometheus text format."""
+
+    def __init__(self, buckets: Sequence[float] = DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def observe(self, name: str, seconds: float, error: bool) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                # per-bucket counts (last one is +Inf), sum, count, errors
+                series = self._series[name] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+            series[3] += error
+
+    def render(self) -> str:
+        lines = [
+            '# HELP deepresearch_span_duration_seconds Duration of agent spans.',
+            '# TYPE deepresearch_span_duration_seconds histogram',
+        ]
+        errors = [
+            '# HELP deepresearch_span_errors_total Spans that ended with an error.',
+            '# TYPE deepresearch_span_errors_total counter',
+        ]
+        with self._lock:
+            series = {name: (list(counts), total, count, failed) for name, (counts, total, count, failed) in self._series.items()}
+        for name, (counts, total, count, failed) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'deepresearch_span_duration_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'deepresearch_span_duration_seconds_sum{{span="{name}"}} {total}')
+            lines.append(f'deepresearch_span_duration_seconds_count{{span="{name}"}} {count}')
+            errors.append(f'deepresearch_span_errors_total{{span="{name}"}} {failed}')
+        return '\n'.join(lines + errors) + '\n'
+
+    def serve(self, port: int, host: str = DEFAULT_METRICS_HOST):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='span-metrics', daemon=True).start()
+        return self._server
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = 0.0, exporters: Sequence = (), metrics: Optional[SpanMetrics] = None):
+        self.sample_rate = sample_rate if exporters else 0.0
+        self.exporters = list(exporters)
+        self.metrics = metrics
+        # trace id -> ended spans, from the start of a sampled root to its end
+        self._traces: Dict[int, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, **attributes: Any):
+        parent = _current.get()
+        if parent is None:
+            if not self.sample_rate and self.metrics is None:
+                return NOOP_SPAN
+            sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+            if not sampled and self.metrics is None:
+                return _UnsampledRoot()
+            root = Span(self, name, None, sampled, attributes)
+            if sampled:
+                with self._lock:
+                    self._traces[root.trace_id] = []
+            return root
+        if not isinstance(parent, Span):
+            return NOOP_SPAN
+        return Span(self, name, parent, parent.sampled, attributes)
+
+    def _finish(self, span: Span) -> None:
+        if self.metrics is not None:
+            self.metrics.observe(span.name, (span.end_ns - span.start_ns) / 1e9, span.status == STATUS_ERROR)
+        if not span.sampled:
+            return
+        with self._lock:
+            if span.parent_id is None:
+                spans = self._traces.pop(span.trace_id, [])
+            else:
+                spans = self._traces.get(span.trace_id)
+                if spans is not None:
+                    spans.append(span)
+                    return
+                # its root is exported already, like an evaluator metric outliving an early exit:
+                # it goes out on its own, collectors join spans of a trace by its id
+                spans = []
+        spans.append(span)
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception as error:
+                logger.warning('Trace export failed: %s', error)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def configure(sample_rate: float = 1.0, exporters: Sequence = (), metrics: Optional[SpanMetrics] = None) -> Tracer:
+    global _tracer
+    with _tracer_lock:
+        _tracer = Tracer(sample_rate, exporters, metrics)
+    return _tracer
+
+
+def _from_environment() -> Tracer:
+    exporters = [OTLPFileExporter(os.environ[TRACE_FILE_ENV])] if os.environ.get(TRACE_FILE_ENV) else []
+    metrics = None
+    if os.environ.get(METRICS_PORT_ENV):
+        metrics = SpanMetrics()
+        metrics.serve(int(os.environ[METRICS_PORT_ENV]), os.environ.get(METRICS_HOST_ENV) or DEFAULT_METRICS_HOST)
+    return Tracer(float(os.environ.get(SAMPLE_RATE_ENV) or 0), exporters, metrics)
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = _from_environment()
+    return _tracer
+
+
+def current_span():
+    span = _current.get()
+    return span if span is not None else NOOP_SPAN
+
+
+def span(name: str, **attributes: Any):
+    """Starts a span under the current one; use as a context manager or call end()."""
+    return get_tracer().start_span(name, **attributes)
+
+
+def traced(name: str) -> Callable:
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_tracer().start_span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def propagate(fn: Callable) -> Callable:
+    """Runs `fn` in a copy of the caller's context, so spans it starts on a pool thread nest under the caller's."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
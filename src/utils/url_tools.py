@@ -0,0 +1,71 @@
+import random
+from typing import Dict, List
+from urllib.parse import urlparse
+
+
+def weightedURLToString(urls: List[Dict], limit: int) -> str:
+    if not urls:
+        return ""
+    sorted_urls = sorted(urls, key=lambda x: x.get('weight', 0), reverse=True)[:limit]
+    return '\n'.join(f"{url['url']} ({url.get('weight', 0)})" for url in sorted_urls)
+
+def normalizeUrl(url: str) -> str:
+    # Basic URL normalization (add more robust logic if needed)
+    return url.strip()
+
+def countUrlParts(urls: List[Dict]) -> Dict:
+    hostname_counts = {}
+    for url_dict in urls:
+        url = url_dict.get('url', '')
+        if url:
+            try:
+                hostname = urlparse(url).hostname
+                if hostname:
+                    hostname_counts[hostname] = hostname_counts.get(hostname, 0) + 1
+            except Exception:
+                pass
+    return {"hostnameCount": hostname_counts}
+
+def sampleMultinomial(items: List[tuple]) -> str:
+    if not items:
+        return ""
+    total_weight = sum(item[1] for item in items)
+    if total_weight == 0:
+        return random.choice([item[0] for item in items])
+    r = random.uniform(0, total_weight)
+    upto = 0
+    for item in items:
+        upto += item[1]
+        if upto >= r:
+            return item[0]
+    return items[-1][0]
+
+def addToAllURLs(url_dict: Dict, all_urls: Dict[str, Dict]):
+    normalized_url = normalizeUrl(url_dict['url'])
+    if normalized_url not in all_urls:
+        all_urls[normalized_url] = url_dict
+
+def rankURLs(urls: List[Dict], question_data: Dict, context: Dict) -> List[Dict]:
+    # Placeholder for URL ranking logic (replace with actual ranking algorithm)
+    return urls
+
+def filterURLs(all_urls: Dict[str, Dict], visited_urls: List[str]) -> List[Dict]:
+    return [url_data for url_data in all_urls.values() if url_data['url'] not in visited_urls]
+
+def keepKPerHostname(urls: List[Dict], k: int) -> List[Dict]:
+    hostname_counts = {}
+    result = []
+    for url_data in urls:
+        try:
+            hostname = urlparse(url_data['url']).hostname
+            if hostname:
+                hostname_counts[hostname] = hostname_counts.get(hostname, 0) + 1
+                if hostname_counts[hostname] <= k:
+                    result.append(url_data)
+        except Exception:
+            result.append(url_data) #If error, add to list.
+    return result
+
+def getLastModified(url: str) -> str:
+    # Placeholder for getting last modified date
+    return None